@@ -0,0 +1,172 @@
+"""Incrementally maintained counters behind ``/api/admin/summary``.
+
+AdminDashboard.tsx used to download every profile, property and tour request
+and count them in the browser. Here each table feed only reports changed
+rows; every row remembers what it contributed, so an update moves its counts
+from the old bucket to the new one. Serving the summary reads the counters
+and never touches rows, so its cost does not grow with the tables.
+"""
+import bisect
+import threading
+from collections import Counter
+from datetime import date, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from auth import current_user
+
+PRICE_PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class AdminSummary:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._profiles = {}    # profile id -> (user_type, role)
+        self._listings = {}    # property id -> (property_type, is_available, price)
+        self._tours = {}       # tour request id -> (status, requested_date)
+        self.users_by_type = Counter()
+        self.users_by_role = Counter()
+        self.listings_by_type = Counter()
+        self.listings_by_availability = Counter()
+        self.tours_by_status = Counter()
+        self.tours_by_day = Counter()
+        self._prices = []      # kept sorted for O(1) percentiles
+        self._price_total = 0.0
+
+    # -- feed listeners ----------------------------------------------------
+
+    # A reset builds the new state off-lock and swaps it in, so is_admin() and
+    # the summary endpoint never wait for a full snapshot to be counted.
+
+    @staticmethod
+    def _profile(row):
+        return row.get("user_type") or "guest", row.get("role") or "renter"
+
+    @staticmethod
+    def _listing(row):
+        return (row.get("property_type") or "unknown", row.get("is_available") is not False,
+                float(row.get("price") or 0))
+
+    @staticmethod
+    def _tour(row):
+        return row.get("status") or "pending", str(row.get("requested_date") or "")[:10]
+
+    def apply_profiles(self, rows, reset=False):
+        if reset:
+            profiles = {row["id"]: self._profile(row) for row in rows}
+            by_type = Counter(value[0] for value in profiles.values())
+            by_role = Counter(value[1] for value in profiles.values())
+            with self._lock:
+                self._profiles, self.users_by_type, self.users_by_role = profiles, by_type, by_role
+            return
+        with self._lock:
+            for row in rows:
+                old = self._profiles.get(row["id"])
+                if old is not None:
+                    self.users_by_type[old[0]] -= 1
+                    self.users_by_role[old[1]] -= 1
+                new = self._profiles[row["id"]] = self._profile(row)
+                self.users_by_type[new[0]] += 1
+                self.users_by_role[new[1]] += 1
+
+    def apply_properties(self, rows, reset=False):
+        if reset:
+            listings = {row["id"]: self._listing(row) for row in rows}
+            by_type = Counter(value[0] for value in listings.values())
+            by_availability = Counter(value[1] for value in listings.values())
+            prices = sorted(value[2] for value in listings.values())
+            with self._lock:
+                self._listings, self.listings_by_type = listings, by_type
+                self.listings_by_availability = by_availability
+                self._prices, self._price_total = prices, sum(prices)
+            return
+        with self._lock:
+            for row in rows:
+                old = self._listings.get(row["id"])
+                if old is not None:
+                    self.listings_by_type[old[0]] -= 1
+                    self.listings_by_availability[old[1]] -= 1
+                    del self._prices[bisect.bisect_left(self._prices, old[2])]
+                    self._price_total -= old[2]
+                new = self._listings[row["id"]] = self._listing(row)
+                self.listings_by_type[new[0]] += 1
+                self.listings_by_availability[new[1]] += 1
+                bisect.insort(self._prices, new[2])
+                self._price_total += new[2]
+
+    def apply_tours(self, rows, reset=False):
+        if reset:
+            tours = {row["id"]: self._tour(row) for row in rows}
+            by_status = Counter(value[0] for value in tours.values())
+            by_day = Counter(value[1] for value in tours.values())
+            with self._lock:
+                self._tours, self.tours_by_status, self.tours_by_day = tours, by_status, by_day
+            return
+        with self._lock:
+            for row in rows:
+                old = self._tours.get(row["id"])
+                if old is not None:
+                    self.tours_by_status[old[0]] -= 1
+                    self.tours_by_day[old[1]] -= 1
+                new = self._tours[row["id"]] = self._tour(row)
+                self.tours_by_status[new[0]] += 1
+                self.tours_by_day[new[1]] += 1
+
+    # -- reading -----------------------------------------------------------
+
+    def _percentile(self, pct):
+        prices = self._prices
+        if not prices:
+            return None
+        position = (len(prices) - 1) * pct / 100
+        lower = int(position)
+        upper = min(lower + 1, len(prices) - 1)
+        return round(prices[lower] + (prices[upper] - prices[lower]) * (position - lower), 2)
+
+    def is_admin(self, user_id):
+        with self._lock:
+            return "admin" in self._profiles.get(user_id, ())
+
+    def snapshot(self, days=30, today=None):
+        """Counters as the admin dashboard expects them; tours per day cover ``days`` either side of today."""
+        today = today or date.today()
+        with self._lock:
+            listing_count = len(self._listings)
+            average_price = self._price_total / listing_count if listing_count else 0.0
+            window = [today + timedelta(days=offset) for offset in range(-days, days + 1)]
+            return {
+                "users": {
+                    "total": len(self._profiles),
+                    "by_user_type": {key: count for key, count in self.users_by_type.items() if count},
+                    "by_role": {key: count for key, count in self.users_by_role.items() if count},
+                },
+                "listings": {
+                    "total": listing_count,
+                    "available": self.listings_by_availability[True],
+                    "unavailable": self.listings_by_availability[False],
+                    "by_property_type": {key: count for key, count in self.listings_by_type.items() if count},
+                    "average_price": round(average_price, 2),
+                    "total_monthly_rent": round(self._price_total, 2),
+                    "price_percentiles": {f"p{pct}": self._percentile(pct) for pct in PRICE_PERCENTILES},
+                },
+                "tours": {
+                    "total": len(self._tours),
+                    "by_status": {key: count for key, count in self.tours_by_status.items() if count},
+                    "by_day": {day.isoformat(): self.tours_by_day[day.isoformat()] for day in window},
+                },
+            }
+
+
+summary = AdminSummary()
+router = APIRouter(tags=["admin"])
+
+
+def require_admin(user=Depends(current_user)):
+    if user is not None and not summary.is_admin(user.get("id")):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
+
+@router.get("/api/admin/summary", dependencies=[Depends(require_admin)])
+async def admin_summary(days: int = Query(30, ge=0, le=366)):
+    return summary.snapshot(days=days)
@@ -0,0 +1,55 @@
+"""Supabase session checks for endpoints that expose non-public data.
+
+The frontend already holds a Supabase access token; it is forwarded as
+``Authorization: Bearer <token>`` and resolved through the Supabase auth API.
+Resolved tokens are cached briefly so badge polling does not add a round-trip
+per request.
+"""
+import threading
+import time
+import urllib.error
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+import datasource
+
+TOKEN_TTL_SECONDS = 60.0
+MAX_CACHED_TOKENS = 10_000
+
+_tokens = {}  # access token -> (expires at, user)
+_lock = threading.Lock()
+
+
+def resolve_token(token):
+    now = time.monotonic()
+    cached = _tokens.get(token)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    try:
+        user = datasource.fetch_user(token)
+    except urllib.error.HTTPError as exc:
+        if exc.code in (401, 403):
+            raise HTTPException(status_code=401, detail="Invalid or expired session")
+        raise HTTPException(status_code=502, detail="Could not verify session")
+    except OSError:
+        raise HTTPException(status_code=502, detail="Could not verify session")
+    with _lock:
+        if len(_tokens) >= MAX_CACHED_TOKENS:
+            _tokens.clear()
+        _tokens[token] = (now + TOKEN_TTL_SECONDS, user)
+    return user
+
+
+def current_user(authorization: Optional[str] = Header(None)):
+    """FastAPI dependency returning the Supabase auth user for the request.
+
+    Without Supabase configured there is nothing to protect (every index is
+    empty), so local development runs unauthenticated and gets ``None``.
+    """
+    if not datasource.is_configured():
+        return None
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+    return resolve_token(token.strip())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Benchmark nearby-listing queries as the catalogue grows.
+
+Radius query cost should track the number of listings inside the circle,
+not the catalogue size. Usage (from backend/):
+    python benchmarks/bench_geo.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_property_search import percentile  # noqa: E402
+from geo import GridIndex, gazetteer  # noqa: E402
+
+# Listings scattered around the places in the gazetteer, weighted towards Bangkok.
+CENTRES = [(float(record["latitude"]), float(record["longitude"])) for record in gazetteer.records]
+
+
+def synthetic_points(count, seed=7):
+    rng = random.Random(seed)
+    lats, lons = [], []
+    for _ in range(count):
+        lat, lon = rng.choice(CENTRES)
+        lats.append(lat + rng.gauss(0, 0.05))
+        lons.append(lon + rng.gauss(0, 0.05))
+    return lats, lons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the geo grid index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--radius-km", type=float, default=2.0)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    probes = [(lat + rng.uniform(-0.02, 0.02), lon + rng.uniform(-0.02, 0.02))
+              for lat, lon in (rng.choice(CENTRES) for _ in range(args.queries))]
+
+    print(f"{'listings':>10} {'build s':>8} {'radius p50':>11} {'radius p99':>11} {'avg hits':>9} "
+          f"{'knn20 p50':>10} {'knn20 p99':>10}")
+    for size in args.sizes:
+        lats, lons = synthetic_points(size)
+        started = time.perf_counter()
+        grid = GridIndex(range(size), lats, lons)
+        build = time.perf_counter() - started
+
+        radius_ms, knn_ms, hits = [], [], []
+        for lat, lon in probes:
+            started = time.perf_counter()
+            positions, _ = grid.within(lat, lon, args.radius_km)
+            radius_ms.append((time.perf_counter() - started) * 1000)
+            hits.append(positions.size)
+            started = time.perf_counter()
+            grid.nearest(lat, lon, 20)
+            knn_ms.append((time.perf_counter() - started) * 1000)
+
+        print(f"{size:>10,} {build:>8.2f} {statistics.median(radius_ms):>9.3f}ms {percentile(radius_ms, 99):>9.3f}ms "
+              f"{statistics.mean(hits):>9.0f} {statistics.median(knn_ms):>8.3f}ms {percentile(knn_ms, 99):>8.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmark variant rendering throughput in images per second per core.
+
+Renders synthetic phone-sized photos into the card and detail variants the
+frontend requests, first in this process (one core) and then through the
+store's process pool. Usage (from backend/):
+    python benchmarks/bench_images.py --images 40 --workers 4
+"""
+import argparse
+import io
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_property_search import percentile  # noqa: E402
+from images import ImageStore, render_variant  # noqa: E402
+
+# (width, format) pairs a listing page actually asks for: cards, retina cards, detail view
+VARIANTS = [(480, "webp"), (960, "webp"), (480, "jpeg"), (1280, "webp")]
+
+
+def synthetic_photo(width, height, seed):
+    """Smooth gradients plus sensor-like noise, so encoders do realistic work."""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [
+        127 + 100 * np.sin(xs / rng.uniform(60, 400) + rng.uniform(0, 6)) * np.cos(ys / rng.uniform(60, 400))
+        for _ in range(3)
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 12, (height, width, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image variant rendering")
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--size", default="4032x3024", help="Original photo size, WIDTHxHEIGHT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    width, height = map(int, args.size.split("x"))
+
+    root = tempfile.mkdtemp(prefix="mmhub-images-")
+    try:
+        store = ImageStore(root=root, max_cache_bytes=10 * 1024 ** 3, workers=args.workers)
+        started = time.perf_counter()
+        digests = [store.ingest(synthetic_photo(width, height, seed))[0] for seed in range(args.images)]
+        print(f"generated {len(digests)} originals of {width}x{height} in {time.perf_counter() - started:.1f}s")
+
+        def jobs(tag=""):
+            for digest in digests:
+                for requested, fmt in VARIANTS:
+                    bucket, path = store.plan(digest, requested, fmt)
+                    yield store.original_path(digest), f"{path}.{tag}" if tag else path, bucket, fmt
+
+        # One core: every variant of every photo in this process.
+        per_variant = {variant: [] for variant in VARIANTS}
+        started = time.perf_counter()
+        for job, variant in zip(jobs("serial"), VARIANTS * len(digests)):
+            began = time.perf_counter()
+            render_variant(*job)
+            per_variant[variant].append((time.perf_counter() - began) * 1000)
+        serial_s = time.perf_counter() - started
+        rendered = len(digests) * len(VARIANTS)
+        print(f"\none core: {rendered} variants in {serial_s:.2f}s = {rendered / serial_s:.1f} variants/s, "
+              f"{len(digests) / serial_s:.2f} source images/s")
+        print(f"{'variant':>12} {'p50 ms':>8} {'p95 ms':>8}")
+        for (requested, fmt), timings in per_variant.items():
+            print(f"{f'{requested} {fmt}':>12} {statistics.median(timings):8.1f} {percentile(timings, 95):8.1f}")
+
+        # Process pool, as the API and pre-generation command use it.
+        list(store.pool.map(render_variant, *zip(*list(jobs("warm"))[:args.workers])))
+        started = time.perf_counter()
+        list(store.pool.map(render_variant, *zip(*jobs())))
+        pooled_s = time.perf_counter() - started
+        store.shutdown()
+        print(f"\npool of {args.workers}: {rendered} variants in {pooled_s:.2f}s = {rendered / pooled_s:.1f} variants/s "
+              f"({rendered / pooled_s / args.workers:.1f} per core), {len(digests) / pooled_s:.2f} source images/s")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
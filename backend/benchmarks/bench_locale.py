@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark GeoIP lookups and batch price conversion.
+
+Builds a synthetic country table the size of the free country-level CSVs,
+loads it the way the API does, and times single lookups and a page of
+price conversions. Usage (from backend/):
+    python benchmarks/bench_locale.py --ranges 600000
+"""
+import argparse
+import gzip
+import ipaddress
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_property_search import percentile  # noqa: E402
+from currency import COUNTRY_TO_CURRENCY, GeoIPTable, convert, price_ranges  # noqa: E402
+
+COUNTRIES = sorted(COUNTRY_TO_CURRENCY) + ["BR", "MX", "KR", "VN", "MY", "ID", "PH", "ZA"]
+
+
+def write_table(path, ranges, seed=5):
+    rng = random.Random(seed)
+    v4_bounds = sorted(rng.sample(range(1 << 24, 0xE0000000), 2 * ranges))
+    v6_bounds = sorted({(0x2400 << 112) + rng.getrandbits(108) for _ in range(ranges // 5 * 2)})
+    v6_bounds = v6_bounds[:len(v6_bounds) // 2 * 2]
+    with gzip.open(path, "wt") as out:
+        for bounds, family in ((v4_bounds, ipaddress.IPv4Address), (v6_bounds, ipaddress.IPv6Address)):
+            for start, end in zip(bounds[::2], bounds[1::2]):
+                out.write(f"{family(start)},{family(end)},{rng.choice(COUNTRIES)}\n")
+    return v4_bounds, v6_bounds
+
+
+def timed_us(function, arguments):
+    timings = []
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GeoIP lookups and price conversion")
+    parser.add_argument("--ranges", type=int, default=600_000, help="IPv4 ranges; IPv6 gets a fifth as many")
+    parser.add_argument("--lookups", type=int, default=50_000)
+    parser.add_argument("--page", type=int, default=50, help="Prices converted per request")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="mmhub-geoip-")
+    try:
+        path = os.path.join(root, "geoip.csv.gz")
+        v4_bounds, v6_bounds = write_table(path, args.ranges)
+        table = GeoIPTable(path)
+        started = time.perf_counter()
+        loaded = table.load()
+        print(f"loaded {loaded:,} ranges in {time.perf_counter() - started:.2f}s")
+
+        rng = random.Random(9)
+        v4 = [str(ipaddress.IPv4Address(rng.randrange(v4_bounds[0], v4_bounds[-1]))) for _ in range(args.lookups)]
+        v6 = [str(ipaddress.IPv6Address(rng.randrange(v6_bounds[0], v6_bounds[-1]))) for _ in range(args.lookups)]
+        print(f"{'lookup':>14} {'p50 us':>8} {'p99 us':>8} {'hit rate':>9}")
+        for name, addresses in (("ipv4", v4), ("ipv6", v6)):
+            timings = timed_us(table.lookup, addresses)
+            hits = sum(table.lookup(address) is not None for address in addresses) / len(addresses)
+            print(f"{name:>14} {statistics.median(timings):8.2f} {percentile(timings, 99):8.2f} {hits:9.0%}")
+
+        pages = [[rng.uniform(200, 20000) for _ in range(args.page)] for _ in range(2000)]
+        timings = timed_us(lambda page: convert(page, "USD", "THB"), pages)
+        print(f"{f'convert x{args.page}':>14} {statistics.median(timings):8.2f} {percentile(timings, 99):8.2f}")
+        timings = timed_us(price_ranges, ["THB"] * 2000)
+        print(f"{'price ranges':>14} {statistics.median(timings):8.2f} {percentile(timings, 99):8.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Benchmark /api/locations/suggest as a user types, cold and with a warm cache.
+
+Usage (from backend/):
+    python benchmarks/bench_location_suggest.py --listings 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_property_search import percentile, synthetic_rows  # noqa: E402
+from location_suggest import LocationSuggester  # noqa: E402
+
+TYPED = ["sukhumvit", "thong lo", "thnog lo", "chiang mai", "chaing mai", "patong", "phuket",
+         "ekamai", "silom", "bang na", "ratchada", "hua hin", "nimman", "jomtien", "asok"]
+
+
+def keystrokes(words):
+    for word in words:
+        for end in range(1, len(word) + 1):
+            yield word[:end]
+
+
+def run(suggester, queries, cold):
+    timings = []
+    for query in queries:
+        if cold:
+            suggester.apply([])  # clears the LRU cache without touching the index
+        started = time.perf_counter()
+        suggester.suggest(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the location autocomplete index")
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    suggester = LocationSuggester()
+    started = time.perf_counter()
+    suggester.apply(list(synthetic_rows(args.listings)), reset=True)
+    print(f"learned places from {args.listings:,} listings in {time.perf_counter() - started:.2f}s")
+
+    queries = list(keystrokes(TYPED)) * args.rounds
+    for label, cold in (("cold (cache cleared)", True), ("warm (LRU hits)", False)):
+        timings = run(suggester, queries, cold)
+        elapsed = sum(timings) / 1000
+        print(f"{label:<22} n={len(timings):>5}  p50={statistics.median(timings):.3f}ms  "
+              f"p99={percentile(timings, 99):.3f}ms  max={max(timings):.3f}ms  "
+              f"~{len(timings) / elapsed:,.0f} keystrokes/s")
+    print(suggester.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Benchmark /api/properties/search over a synthetic catalogue.
+
+Usage (from backend/):
+    python benchmarks/bench_property_search.py --listings 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from property_search import PROPERTY_TYPES, PropertyIndex  # noqa: E402
+
+AREAS = [
+    ("Sukhumvit", "Watthana, Bangkok"), ("Thong Lo", "Watthana, Bangkok"), ("Asok", "Watthana, Bangkok"),
+    ("Silom", "Bang Rak, Bangkok"), ("Sathorn", "Sathorn, Bangkok"), ("Ari", "Phaya Thai, Bangkok"),
+    ("Chatuchak", "Chatuchak, Bangkok"), ("Ratchada", "Huai Khwang, Bangkok"), ("On Nut", "Suan Luang, Bangkok"),
+    ("Nimman", "Mueang, Chiang Mai"), ("Old City", "Mueang, Chiang Mai"), ("Patong", "Kathu, Phuket"),
+    ("Kata", "Mueang, Phuket"), ("Jomtien", "Bang Lamung, Chonburi"), ("Hua Hin", "Hua Hin, Prachuap Khiri Khan"),
+]
+AMENITIES = [
+    "WiFi", "Air Conditioning", "Parking", "Swimming Pool", "Gym", "Security", "Balcony", "Kitchen",
+    "Washing Machine", "Near BTS", "Near MRT", "Pet Friendly", "Furnished", "Garden", "Ocean View",
+]
+QUERIES = [
+    {},
+    {"location": "Sukhumvit, Bangkok"},
+    {"location": "thong", "max_price": 30000},
+    {"min_price": 10000, "max_price": 25000, "bedrooms": 2},
+    {"property_type": "condo", "amenities": ["Swimming Pool", "Gym"]},
+    {"location": "Chiang Mai", "property_type": "house", "sort": "price_asc"},
+    {"amenities": ["Pet Friendly"], "sort": "price_desc"},
+    {"location": "patong kata", "bedrooms": 3, "amenities": ["Ocean View"]},
+]
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed)
+    epoch = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for property_id in range(1, count + 1):
+        area, district = rng.choice(AREAS)
+        property_type = rng.choice(PROPERTY_TYPES)
+        created = epoch + timedelta(minutes=rng.randrange(60 * 24 * 600))
+        yield {
+            "id": property_id,
+            "title": f"{property_type.title()} in {area}",
+            "price": float(rng.randrange(5000, 150000, 500)),
+            "location": f"{rng.randrange(1, 999)} {area} Road, {district}",
+            "property_type": property_type,
+            "bedrooms": rng.choice([0, 1, 1, 2, 2, 3, 4, 5]),
+            "bathrooms": rng.randint(1, 4),
+            "area_sqm": rng.randrange(25, 400),
+            "amenities": rng.sample(AMENITIES, rng.randint(2, 8)),
+            "images": [],
+            "is_available": rng.random() > 0.1,
+            "created_at": created.isoformat(),
+            "updated_at": created.isoformat(),
+        }
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory property search index")
+    parser.add_argument("--listings", type=int, default=100_000)
+    parser.add_argument("--iterations", type=int, default=200, help="Timed runs per query (default: 200)")
+    args = parser.parse_args()
+
+    rows = list(synthetic_rows(args.listings))
+    index = PropertyIndex()
+    started = time.perf_counter()
+    index.apply(rows, reset=True)
+    print(f"built index over {len(index):,} listings in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    index.apply([dict(row, price=row["price"] + 1000) for row in rows[:1000]])
+    print(f"incremental refresh of 1,000 rows in {(time.perf_counter() - started) * 1000:.1f}ms\n")
+
+    print(f"{'query':<72} {'hits':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for query in QUERIES:
+        timings = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            result = index.search(**query)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{str(query):<72} {result['total']:>7} {statistics.median(timings):>8.2f} "
+              f"{percentile(timings, 95):>8.2f} {percentile(timings, 99):>8.2f}")
+
+    # Walk a filtered result set page by page to exercise the keyset cursor.
+    query = {"location": "Bangkok", "sort": "price_asc", "limit": 50}
+    pages, seen, cursor = 0, 0, None
+    started = time.perf_counter()
+    while True:
+        result = index.search(cursor=cursor, facets=False, **query)
+        pages += 1
+        seen += len(result["items"])
+        cursor = result["next_cursor"]
+        if not cursor or pages == 100:
+            break
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"\npaginated {pages} pages ({seen:,} listings) in {elapsed:.1f}ms ({elapsed / pages:.2f}ms/page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark tour conflict checks and availability with a year of bookings.
+
+Generates thousands of owners with a few properties each and a year of
+pending/confirmed tours, loads them through the feed listener, then times
+conflict checks (against a full scan, which is what the dashboards did)
+and availability queries. Also reports how many notification rows a burst
+of repeated status changes collapses to. Usage (from backend/):
+    python benchmarks/bench_tours.py --owners 5000 --tours-per-property 80
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_property_search import percentile  # noqa: E402
+from tours import (  # noqa: E402
+    DAY_END, DAY_START, EPOCH, NOTIFY_BATCH, TOUR_MINUTES, TourSchedule, to_minutes,
+)
+
+STATUSES = ["pending"] * 3 + ["confirmed"] * 4 + ["completed"] * 2 + ["cancelled"]
+
+
+def synthetic_tours(owners, properties_per_owner, tours_per_property, first_day, seed=13):
+    rng = random.Random(seed)
+    slots = range(DAY_START, DAY_END + 1, TOUR_MINUTES)
+    properties, tours = [], []
+    for owner in range(owners):
+        for _ in range(properties_per_owner):
+            property_id = len(properties) + 1
+            properties.append({"id": property_id, "owner_id": f"owner-{owner}", "title": f"Listing {property_id}"})
+            for _ in range(tours_per_property):
+                day = first_day + timedelta(days=rng.randrange(365))
+                minute = rng.choice(slots)
+                tours.append({
+                    "id": len(tours) + 1, "property_id": property_id, "owner_id": f"owner-{owner}",
+                    "requester_id": f"renter-{rng.randrange(owners * 10)}", "requested_date": day.isoformat(),
+                    "requested_time": f"{minute // 60:02d}:{minute % 60:02d}", "status": rng.choice(STATUSES),
+                })
+    return properties, tours
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tour interval index")
+    parser.add_argument("--owners", type=int, default=3000)
+    parser.add_argument("--properties-per-owner", type=int, default=3)
+    parser.add_argument("--tours-per-property", type=int, default=60, help="Tours per property over the year")
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    first_day = date(2026, 1, 1)
+    properties, rows = synthetic_tours(args.owners, args.properties_per_owner, args.tours_per_property, first_day)
+    schedule = TourSchedule()
+    schedule.apply_properties(properties, reset=True)
+    started = time.perf_counter()
+    schedule.apply(rows, reset=True)
+    print(f"indexed {len(rows):,} tours for {len(properties):,} properties / {args.owners:,} owners "
+          f"in {time.perf_counter() - started:.2f}s ({len(schedule.by_property):,} active)")
+
+    rng = random.Random(3)
+    probes = []
+    for _ in range(args.queries):
+        listing = rng.choice(properties)
+        day = first_day + timedelta(days=rng.randrange(365))
+        minute = rng.randrange(DAY_START, DAY_END + 1, TOUR_MINUTES)
+        probes.append((listing["id"], listing["owner_id"], to_minutes(day, f"{minute // 60:02d}:{minute % 60:02d}")))
+
+    indexed_us, clashes = [], 0
+    for property_id, owner_id, start in probes:
+        began = time.perf_counter()
+        clashes += bool(schedule.conflicts(property_id, owner_id, start))
+        indexed_us.append((time.perf_counter() - began) * 1e6)
+
+    active = [(tour["property_id"], tour["owner_id"], to_minutes(tour["requested_date"], tour["requested_time"]))
+              for tour in rows if tour["status"] in ("pending", "confirmed")]
+    scan_us = []
+    for property_id, owner_id, start in probes[:50]:
+        began = time.perf_counter()
+        [tour for tour in active if (tour[0] == property_id or tour[1] == owner_id)
+         and tour[2] < start + TOUR_MINUTES and tour[2] + TOUR_MINUTES > start]
+        scan_us.append((time.perf_counter() - began) * 1e6)
+
+    print(f"\n{'query':>22} {'p50 us':>9} {'p99 us':>9}")
+    print(f"{'conflict (index)':>22} {statistics.median(indexed_us):9.1f} {percentile(indexed_us, 99):9.1f}"
+          f"   {clashes / len(probes):.0%} of probes clash")
+    print(f"{'conflict (full scan)':>22} {statistics.median(scan_us):9.1f} {percentile(scan_us, 99):9.1f}")
+    for days in (7, 31):
+        timings = []
+        for property_id, _, start in probes[:1000]:
+            day = EPOCH + timedelta(days=start // 1440)
+            began = time.perf_counter()
+            schedule.availability(property_id, day, day + timedelta(days=days - 1), after=0)
+            timings.append((time.perf_counter() - began) * 1e6)
+        print(f"{f'availability {days}d':>22} {statistics.median(timings):9.1f} {percentile(timings, 99):9.1f}")
+
+    # Status-change burst: up to 20k pending tours confirmed, each change delivered three times.
+    burst = [dict(tour, status="confirmed") for tour in rows if tour["status"] == "pending"][:20000]
+    started = time.perf_counter()
+    for _ in range(3):
+        schedule.apply(burst)
+        for tour in burst[:5000]:
+            schedule.queue_notification(tour["id"], tour["requester_id"], "tour_confirmed", "duplicate")
+    queued = schedule.pending_notifications()
+    flushed = asyncio.run(schedule.flush_notifications())
+    print(f"\n{len(burst):,} status changes delivered 3x -> {queued:,} queued, {flushed:,} flushed "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms "
+          f"(bulk inserts of up to {NOTIFY_BATCH} rows)")
+
+
+if __name__ == "__main__":
+    main()
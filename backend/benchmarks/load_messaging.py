@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Load-test the /ws/messages hub with thousands of sockets on one worker.
+
+Starts the API in a child process (local mode, no Supabase) with synthetic
+threads, opens one socket per user, then has random participants send
+messages. Reports delivery latency, throughput, and the server's resident
+memory per open connection.
+
+Usage (from backend/):
+    python benchmarks/load_messaging.py --users 4000 --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from bench_property_search import percentile  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(port, users):
+    os.chdir(BACKEND)
+    os.environ.pop("SUPABASE_URL", None)
+    import uvicorn
+    import main
+    import messaging
+
+    messaging.hub.apply_threads([
+        {"id": thread_id, "participant_1": f"user-{2 * thread_id}", "participant_2": f"user-{2 * thread_id + 1}"}
+        for thread_id in range(users // 2)
+    ])
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning",
+                ws_max_queue=32, ws_per_message_deflate=False)
+
+
+def rss_kib(pid):
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def run(args, port, server_pid):
+    import websockets
+
+    url = f"ws://127.0.0.1:{port}/ws/messages"
+    latencies, delivered = [], 0
+    done = asyncio.Event()
+
+    async def reader(ws):
+        nonlocal delivered
+        async for text in ws:
+            payload = json.loads(text)
+            if payload["type"] == "message" and payload["message"]["sender_id"] != ws.user_id:
+                sent_at = float(payload["message"]["content"])
+                latencies.append((time.perf_counter() - sent_at) * 1000)
+                delivered += 1
+                if delivered >= args.messages:
+                    done.set()
+
+    rss_before = rss_kib(server_pid)
+    started = time.perf_counter()
+    sockets = []
+    for batch in range(0, args.users, 200):
+        opened = await asyncio.gather(*(
+            websockets.connect(f"{url}?user_id=user-{n}", max_queue=64, ping_interval=None)
+            for n in range(batch, min(batch + 200, args.users))
+        ))
+        for offset, ws in enumerate(opened):
+            ws.user_id = f"user-{batch + offset}"
+            await ws.recv()  # hello
+        sockets.extend(opened)
+    connect_s = time.perf_counter() - started
+    await asyncio.sleep(0.5)
+    rss_after = rss_kib(server_pid)
+    per_connection = (rss_after - rss_before) * 1024 / max(len(sockets), 1)
+    print(f"opened {len(sockets):,} sockets in {connect_s:.2f}s; server RSS {rss_before / 1024:.0f} -> "
+          f"{rss_after / 1024:.0f} MiB (~{per_connection / 1024:.1f} KiB per connection)")
+
+    readers = [asyncio.create_task(reader(ws)) for ws in sockets]
+    rng = random.Random(3)
+    started = time.perf_counter()
+    interval = 1 / args.rate if args.rate else 0
+    for sent in range(args.messages):
+        thread_id = rng.randrange(args.users // 2)
+        sender = sockets[2 * thread_id + rng.randint(0, 1)]
+        await sender.send(json.dumps({"type": "send", "thread_id": thread_id, "content": repr(time.perf_counter())}))
+        if interval:
+            await asyncio.sleep(interval)
+        elif sent % 100 == 99:
+            await asyncio.sleep(0)
+    try:
+        await asyncio.wait_for(done.wait(), timeout=60)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"delivered {delivered:,}/{args.messages:,} messages in {elapsed:.2f}s "
+          f"({delivered / elapsed:,.0f} msg/s); server RSS now {rss_kib(server_pid) / 1024:.0f} MiB")
+    if latencies:
+        print(f"delivery latency p50={statistics.median(latencies):.2f}ms p95={percentile(latencies, 95):.2f}ms "
+              f"p99={percentile(latencies, 99):.2f}ms max={max(latencies):.2f}ms")
+
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the messaging WebSocket hub")
+    parser.add_argument("--users", type=int, default=4000, help="Concurrent sockets, two per thread")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--rate", type=float, default=1000, help="Messages per second (0: as fast as possible)")
+    args = parser.parse_args()
+
+    port = free_port()
+    server = multiprocessing.Process(target=serve, args=(port, args.users), daemon=True)
+    server.start()
+    deadline = time.monotonic() + 20
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                sys.exit("server did not start")
+            time.sleep(0.2)
+    try:
+        asyncio.run(run(args, port, server.pid))
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
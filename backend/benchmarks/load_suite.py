@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Reproducible local load test of the API and serve_spa.py, with a JSON baseline report.
+
+Seeds the SQLite PostgREST stand-in (``postgrest_standin.py``) from the
+repo's sample data, starts ``uvicorn main:app`` against it, waits for the
+feeds to load, then runs each read scenario with concurrent keep-alive
+clients for a fixed time. Request paths come from a fixed seed, so two runs
+send the same traffic. The report records client-side rps and
+p50/p95/p99, the server's own per-route view from ``/metrics/summary``
+(including event-loop lag), and both ``scripts/serve_spa.py`` modes.
+
+    python benchmarks/load_suite.py --output benchmarks/baseline.json
+    python benchmarks/load_suite.py --baseline benchmarks/baseline.json
+
+With ``--baseline``, exits 1 if any scenario's p95 rose or its throughput
+fell by more than the tolerance, or if it started failing. Numbers are only
+comparable on the same machine; record a baseline before changing code.
+The clients share the machine with the server, so on a small box runs vary
+by a third or so; the default tolerance only flags changes beyond that.
+``--postgrest-url`` points the app at a real local PostgREST (e.g.
+``supabase start``) instead of the stand-in.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import date, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(os.path.dirname(BACKEND), "scripts")
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, SCRIPTS)
+
+import bench_serve_spa  # noqa: E402
+from bench_property_search import percentile  # noqa: E402
+from postgrest_standin import ADMIN_ID, SAMPLE_PROFILES, StandIn, serve  # noqa: E402
+
+RENTER_ID = SAMPLE_PROFILES[3][0]
+QUERIES = ["bangkok", "phuket", "thonglor", "asoke", "condo", "villa", "sukhumvit"]
+PREFIXES = ["ban", "bang", "phu", "tho", "su", "sukh", "asok", "chiang"]
+POINTS = [(13.7367, 100.5608), (13.7246, 100.5854), (7.8961, 98.2964), (18.7883, 98.9853)]
+AMENITIES = ["WiFi", "Parking", "Air Conditioning", "Pool"]
+FORWARDED = ["203.0.113.7", "198.51.100.23", "2001:db8::1", "192.0.2.44"]
+
+
+def scenarios(property_count, seed=7):
+    """name -> list of (method, path, body, headers); each client cycles through its list."""
+    rng = random.Random(seed)
+    admin = {"Authorization": f"Bearer {ADMIN_ID}"}
+    renter = {"Authorization": f"Bearer {RENTER_ID}"}
+    json_body = {"Content-Type": "application/json"}
+    first_day = date.today() + timedelta(days=1)
+    search = []
+    for _ in range(200):
+        query = f"/api/properties/search?location={rng.choice(QUERIES)}&limit=24"
+        if rng.random() < 0.5:
+            query += f"&min_price={rng.choice([0, 10000, 30000])}&max_price={rng.choice([60000, 100000])}"
+        if rng.random() < 0.3:
+            query += f"&amenities={rng.choice(AMENITIES).replace(' ', '+')}"
+        search.append(("GET", query, None, {}))
+    return {
+        "health": [("GET", "/health", None, {})],
+        "search": search,
+        "suggest": [("GET", f"/api/locations/suggest?q={prefix}", None, {}) for prefix in PREFIXES],
+        "nearby": [("GET", f"/api/properties/nearby?lat={lat}&lon={lon}&limit=20", None, {}) for lat, lon in POINTS],
+        "reverse_geocode": [("GET", f"/api/geo/reverse?lat={lat}&lon={lon}", None, {}) for lat, lon in POINTS],
+        "locale": [("GET", "/api/locale", None, {"X-Forwarded-For": address}) for address in FORWARDED],
+        "rates": [("GET", "/api/rates", None, {})],
+        "convert": [("POST", "/api/prices/convert",
+                     json.dumps({"prices": [rng.uniform(5000, 120000) for _ in range(24)], "from": "THB",
+                                 "to": currency, "ranges": True}), json_body)
+                    for currency in ("USD", "EUR", "JPY", "SGD")],
+        "tour_availability": [("GET", f"/api/tours/availability?property_id={rng.randint(1, property_count)}"
+                                      f"&from={first_day + timedelta(days=rng.randrange(60))}", None, {})
+                              for _ in range(100)],
+        "admin_summary": [("GET", "/api/admin/summary", None, admin)],
+        "dashboard": [("GET", f"/api/dashboard/{role}", None, renter) for role in ("renter", "landlord", "agent")],
+        "unread": [("GET", "/api/messages/unread", None, renter)],
+    }
+
+
+def client(port, requests, deadline, latencies, errors, offset):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    i = offset
+    while time.monotonic() < deadline:
+        method, path, body, headers = requests[i % len(requests)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.close()
+
+
+def run_scenario(port, requests, concurrency, duration):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    threads = [threading.Thread(target=client, args=(port, requests, deadline, latencies, errors, n))
+               for n in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 15)
+    elapsed = time.monotonic() - started
+    if not latencies:
+        return {"requests": 0, "errors": len(errors)}
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def get_json(port, path, headers=None):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", headers=headers or {})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def wait_for_feeds(port, listings, timeout=60.0):
+    """Block until the admin summary sees every seeded listing (i.e. the feeds have loaded)."""
+    deadline = time.monotonic() + timeout
+    seen = None
+    while time.monotonic() < deadline:
+        try:
+            summary = get_json(port, "/api/admin/summary", {"Authorization": f"Bearer {ADMIN_ID}"})
+            seen = summary["listings"]["total"]
+            if seen >= listings:
+                return
+        except OSError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"feeds did not load {listings} listings within {timeout:.0f}s (saw {seen})")
+
+
+def compare(report, baseline, tolerance):
+    """Print scenario deltas against ``baseline``; returns the names that regressed."""
+    regressed = []
+    print(f"\n{'vs baseline':<18} {'rps':>8} {'p95':>8}")
+    sections = [("", report["scenarios"], baseline.get("scenarios", {})),
+                ("spa ", report.get("serve_spa", {}), baseline.get("serve_spa", {}))]
+    for prefix, current, previous in sections:
+        for name, now in current.items():
+            before = previous.get(name)
+            if not before or not before.get("requests"):
+                continue
+            if not now.get("requests"):
+                regressed.append(prefix + name)
+                print(f"{prefix + name:<18} failed")
+                continue
+            rps = now["rps"] / before["rps"] - 1
+            p95 = now["p95_ms"] / before["p95_ms"] - 1
+            worse = rps < -tolerance or p95 > tolerance or (now["errors"] and not before["errors"])
+            print(f"{prefix + name:<18} {rps:>+8.0%} {p95:>+8.0%}{'  REGRESSED' if worse else ''}")
+            if worse:
+                regressed.append(prefix + name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and serve_spa.py against seeded local data")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per scenario (default: 5)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scale", type=int, default=500, help="Copies of each sample listing (default: 500)")
+    parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+    parser.add_argument("--postgrest-url", help="Use this PostgREST instead of the SQLite stand-in")
+    parser.add_argument("--spa-dir", default=os.path.join(os.path.dirname(BACKEND), "dist"))
+    parser.add_argument("--skip-spa", action="store_true", help="Skip the serve_spa.py modes")
+    parser.add_argument("--spa-idle-clients", type=int, default=0,
+                        help="Idle connections held open against serve_spa.py (default: 0; one stalls simple mode)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Compare with this report and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative change (default: 0.5)")
+    args = parser.parse_args()
+
+    standin = None
+    if args.postgrest_url:
+        supabase_url, seed = args.postgrest_url, {}
+        listings = 1
+    else:
+        standin = StandIn()
+        standin.seed(args.scale)
+        stand_server = serve(standin)
+        supabase_url, seed = f"http://127.0.0.1:{stand_server.server_port}", standin.counts()
+        listings = seed["properties"]
+        print(f"[load] stand-in seeded: {seed}")
+
+    port = bench_serve_spa.free_port()
+    env = dict(os.environ, SUPABASE_URL=supabase_url,
+               SUPABASE_SERVICE_ROLE_KEY=os.getenv("SUPABASE_SERVICE_ROLE_KEY", "local") if args.postgrest_url
+               else "local")
+    env.pop("METRICS_TOKEN", None)
+    env.pop("METRICS_PROFILER", None)
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                               "--log-level", "warning", "--ws-per-message-deflate", "false"],
+                              cwd=BACKEND, env=env)
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "config": {"duration": args.duration, "concurrency": args.concurrency, "scale": args.scale,
+                   "datasource": "postgrest" if args.postgrest_url else "sqlite-standin"},
+        "seed": seed,
+        "scenarios": {},
+    }
+    try:
+        bench_serve_spa.wait_for_port(port, timeout=30)
+        started = time.monotonic()
+        wait_for_feeds(port, listings)
+        print(f"[load] feeds loaded in {time.monotonic() - started:.1f}s; "
+              f"{args.concurrency} clients, {args.duration:.0f}s per scenario")
+        plans = scenarios(listings)
+        for name, requests in plans.items():
+            if args.only and name not in args.only:
+                continue
+            result = report["scenarios"][name] = run_scenario(port, requests, args.concurrency, args.duration)
+            if not result["requests"]:
+                print(f"{name:<18} no successful requests ({result['errors']} errors)")
+                continue
+            print(f"{name:<18} {result['rps']:>8,.0f} req/s  p50={result['p50_ms']:.2f}ms  "
+                  f"p95={result['p95_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms  errors={result['errors']}")
+        report["server"] = get_json(port, "/metrics/summary")
+        print(f"[load] event-loop lag: {report['server']['event_loop_lag_ms']}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if not args.skip_spa:
+        serve_dir = os.path.abspath(args.spa_dir)
+        synthetic = not os.path.isfile(os.path.join(serve_dir, "index.html"))
+        if synthetic:
+            serve_dir = bench_serve_spa.synthetic_dist()
+        report["config"]["spa_dir"] = "synthetic" if synthetic else os.path.relpath(serve_dir, os.path.dirname(BACKEND))
+        spa_args = argparse.Namespace(duration=args.duration, concurrency=args.concurrency,
+                                      idle_clients=args.spa_idle_clients)
+        try:
+            report["serve_spa"] = {mode: bench_serve_spa.run_mode(mode, serve_dir, spa_args)
+                                   for mode in ("simple", "production")}
+        finally:
+            if synthetic:
+                shutil.rmtree(serve_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as out:
+            json.dump(report, out, indent=2)
+            out.write("\n")
+        print(f"[load] wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressed = compare(report, json.load(handle), args.tolerance)
+        if regressed:
+            print(f"[load] regressed beyond {args.tolerance:.0%}: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""A local PostgREST/Supabase stand-in over SQLite, seeded from the repo's sample data.
+
+The API reads Supabase only through ``datasource`` (PostgREST over HTTP) and
+resolves sessions through ``/auth/v1/user``. This server answers that subset
+so the uvicorn app can be load-tested with real feeds and no network:
+
+- ``GET /rest/v1/<table>`` with ``select``, ``order``, ``limit``, ``offset``
+  and ``eq/neq/gt/gte/lt/lte/like/ilike/is/in`` filters
+- ``POST`` (insert, returns the stored rows) and ``PATCH`` (update by filters)
+- ``GET /auth/v1/user``: the bearer token is the user id of a seeded profile
+
+Tables are created from the INSERT column lists in ``sample-data.sql``,
+``tour-sample-data.sql`` and ``backend/seeds.sql``. Each table also gets
+``id``, ``created_at`` and ``updated_at``. Statements that need Postgres
+(``auth.*``, ``gen_random_uuid()``) are skipped. Sample profiles are seeded
+first, so the ``UPDATE profiles`` statements have rows to act on.
+``--scale N`` clones the sample listings N times.
+
+    python benchmarks/postgrest_standin.py --port 54321 --scale 500
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SEED_FILES = [os.path.join(ROOT, "sample-data.sql"), os.path.join(ROOT, "tour-sample-data.sql"),
+              os.path.join(ROOT, "backend", "seeds.sql")]
+# The users sample-data.sql refers to, plus an admin (user_type is set by its UPDATEs)
+SAMPLE_PROFILES = [
+    ("00000000-0000-4000-8000-00000000ad01", "admin", "admin"),
+    ("4a226a98-3b6c-47b6-9922-9920b7e3229a", "alice_p", "landlord"),
+    ("08c80dd2-faf1-498e-bade-7b46737ab8c4", "bob_s", "landlord"),
+    ("a24119ff-a9ae-45eb-8ba2-78c6b0ed44ad", "renter", "renter"),
+]
+ADMIN_ID = SAMPLE_PROFILES[0][0]
+TEXT_ID_TABLES = {"profiles"}
+JSON_COLUMNS = {"amenities", "images"}
+BOOLEAN_COLUMNS = {"is_available", "is_read", "is_verified"}
+NOW_SQL = "(strftime('%Y-%m-%dT%H:%M:%f', 'now') || '+00:00')"
+OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE", "ilike": "LIKE"}
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _identifier(name):
+    if not IDENTIFIER.match(name):
+        raise BadRequest(f"invalid identifier {name!r}")
+    return f'"{name}"'
+
+
+def _literal(text):
+    """A PostgREST filter value as the SQLite value it should compare equal to."""
+    lowered = text.lower()
+    if lowered in ("true", "false"):
+        return int(lowered == "true")
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+
+def _stored(column, value):
+    if column in JSON_COLUMNS or isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _decoded(row):
+    for column in JSON_COLUMNS.intersection(row):
+        if isinstance(row[column], str):
+            row[column] = json.loads(row[column])
+    for column in BOOLEAN_COLUMNS.intersection(row):
+        if row[column] is not None:
+            row[column] = bool(row[column])
+    return row
+
+
+class StandIn:
+    """Schemaless-ish tables in one SQLite database: columns are added the first time they're used."""
+
+    def __init__(self, path=":memory:"):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._columns = {}   # table -> set of column names
+
+    def ensure(self, table, columns=()):
+        with self._lock:
+            known = self._columns.get(table)
+            if known is None:
+                id_column = "id TEXT PRIMARY KEY" if table in TEXT_ID_TABLES else "id INTEGER PRIMARY KEY AUTOINCREMENT"
+                self.db.execute(f"CREATE TABLE IF NOT EXISTS {_identifier(table)} ({id_column}, "
+                                f"created_at TEXT DEFAULT {NOW_SQL}, updated_at TEXT DEFAULT {NOW_SQL})")
+                known = self._columns[table] = {"id", "created_at", "updated_at"}
+            for column in columns:
+                if column not in known:
+                    self.db.execute(f"ALTER TABLE {_identifier(table)} ADD COLUMN {_identifier(column)}")
+                    known.add(column)
+
+    def _where(self, table, filters):
+        clauses, values = [], []
+        for column, expression in filters.items():
+            self.ensure(table, [column])
+            negate = expression.startswith("not.")
+            operator, _, raw = expression[4 if negate else 0:].partition(".")
+            name = _identifier(column)
+            if operator == "is":
+                clause = f"{name} IS {'NULL' if raw == 'null' else int(raw == 'true')}"
+            elif operator == "in":
+                items = [item.strip().strip('"') for item in raw.strip("()").split(",") if item.strip()]
+                clause = f"{name} IN ({','.join('?' * len(items))})" if items else "0"
+                values += [_literal(item) for item in items]
+            elif operator in OPERATORS:
+                if operator == "ilike":
+                    name = f"lower({name})"
+                    raw = raw.lower()
+                clause = f"{name} {OPERATORS[operator]} ?"
+                values.append(_literal(raw.replace("*", "%")) if "like" in operator else _literal(raw))
+            else:
+                raise BadRequest(f"unsupported operator {operator!r}")
+            clauses.append(f"NOT ({clause})" if negate else clause)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", values
+
+    def select(self, table, params):
+        params = dict(params)
+        columns = params.pop("select", "*")
+        order = params.pop("order", "")
+        limit = params.pop("limit", None)
+        offset = params.pop("offset", None)
+        with self._lock:
+            self.ensure(table)
+            if columns.strip() == "*":
+                projection = "*"
+            else:
+                names = [column.strip() for column in columns.split(",") if column.strip()]
+                self.ensure(table, names)
+                projection = ", ".join(_identifier(name) for name in names)
+            where, values = self._where(table, params)
+            sql = f"SELECT {projection} FROM {_identifier(table)}{where}"
+            if order:
+                terms = []
+                for term in order.split(","):
+                    column, *modifiers = term.strip().split(".")
+                    self.ensure(table, [column])
+                    terms.append(f"{_identifier(column)} {'DESC' if 'desc' in modifiers else 'ASC'}")
+                sql += " ORDER BY " + ", ".join(terms)
+            if limit is not None or offset is not None:
+                sql += " LIMIT ? OFFSET ?"
+                values += [int(limit) if limit is not None else -1, int(offset or 0)]
+            return [_decoded(dict(row)) for row in self.db.execute(sql, values)]
+
+    def insert(self, table, rows):
+        rows = rows if isinstance(rows, list) else [rows]
+        stored = []
+        with self._lock, self.db:
+            for row in rows:
+                self.ensure(table, row)
+                names = ", ".join(_identifier(column) for column in row)
+                cursor = self.db.execute(
+                    f"INSERT INTO {_identifier(table)} ({names}) VALUES ({','.join('?' * len(row))})",
+                    [_stored(column, value) for column, value in row.items()])
+                stored.append(cursor.lastrowid)
+            return self._rows_by_rowid(table, stored)
+
+    def update(self, table, filters, values):
+        with self._lock, self.db:
+            self.ensure(table, values)
+            where, arguments = self._where(table, filters)
+            rowids = [row[0] for row in self.db.execute(f"SELECT rowid FROM {_identifier(table)}{where}", arguments)]
+            if rowids:
+                assignments = ", ".join(f"{_identifier(column)} = ?" for column in values)
+                self.db.execute(
+                    f"UPDATE {_identifier(table)} SET {assignments}{',' if values else ''} updated_at = {NOW_SQL} "
+                    f"WHERE rowid IN ({','.join('?' * len(rowids))})",
+                    [_stored(column, value) for column, value in values.items()] + rowids)
+            return self._rows_by_rowid(table, rowids)
+
+    def _rows_by_rowid(self, table, rowids):
+        if not rowids:
+            return []
+        query = f"SELECT * FROM {_identifier(table)} WHERE rowid IN ({','.join('?' * len(rowids))}) ORDER BY rowid"
+        return [_decoded(dict(row)) for row in self.db.execute(query, rowids)]
+
+    def user(self, user_id):
+        rows = self.select("profiles", {"id": f"eq.{user_id}", "select": "id,username"})
+        if not rows:
+            return None
+        return {"id": rows[0]["id"], "email": f"{rows[0]['username']}@example.com", "role": "authenticated"}
+
+    def run_sql_file(self, path):
+        """Run the parts of a Supabase SQL seed file that SQLite understands; returns statements run."""
+        with open(path, encoding="utf-8") as handle:
+            text = "\n".join(line for line in handle if not line.lstrip().startswith("--"))
+        executed = 0
+        for statement in re.split(r";\s*(?:\n|$)", text):
+            statement = statement.strip()
+            if not statement or re.search(r"\bauth\.|gen_random_uuid|crypt\(", statement):
+                continue
+            statement = re.sub(r"::jsonb?\b", "", statement)
+            statement = re.sub(r"\s+ON CONFLICT(\s*\([^)]*\))?\s+DO NOTHING\s*$", "", statement, flags=re.I)
+            insert = re.match(r"INSERT INTO (\w+)\s*\(([^)]*)\)", statement, re.I)
+            update = re.match(r"UPDATE (\w+) SET (\w+)", statement, re.I)
+            if insert:
+                self.ensure(insert.group(1), [column.strip() for column in insert.group(2).split(",")])
+                statement = "INSERT OR IGNORE" + statement[len("INSERT"):]
+            elif update:
+                self.ensure(update.group(1), [update.group(2)])
+            else:
+                continue
+            with self._lock, self.db:
+                self.db.execute(statement)
+            executed += 1
+        return executed
+
+    def seed(self, scale=1):
+        self.insert("profiles", [{"id": user_id, "username": username, "role": role}
+                                 for user_id, username, role in SAMPLE_PROFILES])
+        for path in SEED_FILES:
+            self.run_sql_file(path)
+        if scale > 1:
+            self.clone_properties(scale)
+
+    def clone_properties(self, scale):
+        """Add ``scale - 1`` copies of every sample listing with varied titles and prices."""
+        with self._lock, self.db:
+            columns = [column for column in self._columns["properties"]
+                       if column not in ("id", "created_at", "updated_at", "title", "price")]
+            names = ", ".join(_identifier(column) for column in columns)
+            last_id = self.db.execute("SELECT max(id) FROM properties").fetchone()[0]
+            for copy in range(1, scale):
+                self.db.execute(
+                    f"INSERT INTO properties (title, price, {names}) "
+                    f"SELECT title || ' #{copy}', round(price * {1 + (copy % 40 - 20) / 100}), {names} "
+                    f"FROM properties WHERE id <= ?", [last_id])
+
+    def counts(self):
+        with self._lock:
+            return {table: self.db.execute(f"SELECT count(*) FROM {_identifier(table)}").fetchone()[0]
+                    for table in sorted(self._columns)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    standin = None   # set by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        table = url.path[len("/rest/v1/"):] if url.path.startswith("/rest/v1/") else None
+        return url.path, table, params
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def _handle(self, action):
+        try:
+            self._reply(*action())
+        except (BadRequest, sqlite3.Error, ValueError) as exc:
+            self._reply(400, {"message": str(exc)})
+
+    def do_GET(self):
+        path, table, params = self._route()
+        if path == "/auth/v1/user":
+            token = self.headers.get("Authorization", "").partition(" ")[2].strip()
+            user = self.standin.user(token) if token else None
+            return self._reply(200, user) if user else self._reply(401, {"message": "invalid JWT"})
+        if table is None:
+            return self._reply(404, {"message": "not found"})
+        self._handle(lambda: (200, self.standin.select(table, params)))
+
+    def do_POST(self):
+        _, table, _ = self._route()
+        if table is None:
+            return self._reply(404, {"message": "not found"})
+        self._handle(lambda: (201, self.standin.insert(table, self._body())))
+
+    def do_PATCH(self):
+        _, table, params = self._route()
+        if table is None:
+            return self._reply(404, {"message": "not found"})
+        self._handle(lambda: (200, self.standin.update(table, params, self._body() or {})))
+
+
+def serve(standin, port=0):
+    """Start serving ``standin`` on 127.0.0.1 in a daemon thread; returns the server."""
+    handler = type("StandInHandler", (Handler,), {"standin": standin})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a seeded PostgREST stand-in over SQLite")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--db", default=":memory:", help="SQLite file (default: in memory)")
+    parser.add_argument("--scale", type=int, default=1, help="Copies of each sample listing")
+    args = parser.parse_args()
+
+    standin = StandIn(args.db)
+    standin.seed(args.scale)
+    server = serve(standin, args.port)
+    print(f"seeded {standin.counts()}")
+    print(f"SUPABASE_URL=http://127.0.0.1:{server.server_port} SUPABASE_SERVICE_ROLE_KEY=local "
+          f"(admin token: {ADMIN_ID})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
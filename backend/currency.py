@@ -0,0 +1,285 @@
+"""Visitor locale, exchange rates and batch price conversion without third-party calls.
+
+``CurrencyService.detectUserLocation`` and the geolocation IP fallback used
+to ask ipapi.co on every fresh visit. ``/api/locale`` now resolves the
+client address against a GeoIP country table loaded into memory. IPv4
+ranges are sorted ``uint32`` arrays searched with ``np.searchsorted``;
+IPv6 ranges are sorted Python ints searched with ``bisect``. Both are a
+binary search; a lookup, address parsing included, takes about 10 µs.
+
+The table is any free country-level range CSV: DB-IP "IP to Country Lite"
+(``start_ip,end_ip,country``) or IP2Location LITE DB1 (integer ``from,to``).
+It may be gzipped. Point ``GEOIP_CSV`` at it; without it, only CDN country
+headers are used.
+
+Rates come from ``data/exchange_rates.json``, a copy of the constants the
+frontend shipped with. The file is re-read when it changes, and each
+version gets its own ``rates_version`` and ETag. ``/api/prices/convert``
+converts a page of prices and the ``getPriceRanges`` buckets in one NumPy
+call.
+"""
+import bisect
+import csv
+import gzip
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Annotated, List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger("mmhub.currency")
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+GEOIP_PATH = os.getenv("GEOIP_CSV", os.path.join(DATA_DIR, "geoip-country.csv.gz"))
+RATES_PATH = os.getenv("EXCHANGE_RATES_PATH", os.path.join(DATA_DIR, "exchange_rates.json"))
+RATES_RELOAD_SECONDS = 60.0
+DEFAULT_CURRENCY = "USD"
+MAX_PRICES = 1000
+
+# Mirrors COUNTRY_TO_CURRENCY in src/utils/currency.ts
+COUNTRY_TO_CURRENCY = {
+    "US": "USD", "CA": "CAD", "GB": "GBP",
+    "DE": "EUR", "FR": "EUR", "IT": "EUR", "ES": "EUR", "NL": "EUR", "AT": "EUR", "BE": "EUR",
+    "TH": "THB", "JP": "JPY", "AU": "AUD", "SG": "SGD", "CN": "CNY", "IN": "INR",
+}
+# Set by CDNs/proxies in front of the API; trusted before the local table.
+COUNTRY_HEADERS = ("cf-ipcountry", "cloudfront-viewer-country", "x-vercel-ip-country", "x-country-code")
+# Mirrors getPriceRanges() in src/utils/currency.ts, in USD
+PRICE_RANGES_USD = np.array([(0, 500), (500, 1000), (1000, 1500), (1500, 2000),
+                             (2000, 3000), (3000, 5000), (5000, 10000)], dtype=np.float64)
+MAX_PRICE_USD = 10000
+
+
+def _ip_value(text):
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    family = socket.AF_INET6 if ":" in text else socket.AF_INET
+    try:
+        return int.from_bytes(socket.inet_pton(family, text), "big")
+    except OSError:
+        raise ValueError(text) from None
+
+
+class GeoIPTable:
+    """Country ranges as sorted integer arrays; one binary search per lookup."""
+
+    def __init__(self, path=GEOIP_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.countries = []
+        self._v4 = (np.empty(0, np.uint32), np.empty(0, np.uint32), np.empty(0, np.uint16))
+        self._v6 = ([], [], [])
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.warning("GeoIP table %s not found; /api/locale will rely on CDN country headers", self.path)
+            return 0
+        started = time.perf_counter()
+        countries, codes = [], {}
+        v4, v6 = [], []
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rt", newline="", encoding="utf-8") as handle:
+            for row in csv.reader(handle):
+                if len(row) < 3:
+                    continue
+                country = row[2].strip().upper()
+                if len(country) != 2 or country in ("ZZ", "--"):
+                    continue  # unassigned / reserved
+                try:
+                    start, end = _ip_value(row[0]), _ip_value(row[1])
+                except ValueError:
+                    continue  # header row
+                if country not in codes:
+                    codes[country] = len(countries)
+                    countries.append(country)
+                is_v4 = end <= 0xFFFFFFFF and ":" not in row[0]
+                (v4 if is_v4 else v6).append((start, end, codes[country]))
+        v4.sort()
+        v6.sort()
+        v4_table = (np.array([r[0] for r in v4], np.uint32), np.array([r[1] for r in v4], np.uint32),
+                    np.array([r[2] for r in v4], np.uint16))
+        v6_table = ([r[0] for r in v6], [r[1] for r in v6], [r[2] for r in v6])
+        with self._lock:
+            self.countries, self._v4, self._v6 = countries, v4_table, v6_table
+            self.loaded = True
+        logger.info("loaded %d IPv4 and %d IPv6 GeoIP ranges in %.1fs", len(v4), len(v6),
+                    time.perf_counter() - started)
+        return len(v4) + len(v6)
+
+    def lookup(self, address):
+        """ISO country code for an IP address string, or None."""
+        # Request addresses are client-supplied: only dotted/colon notation, never the
+        # CSV's bare integers, so every value fits the family's range.
+        try:
+            parsed = ipaddress.ip_address(address.strip())
+        except ValueError:
+            return None
+        value, is_v6 = int(parsed), parsed.version == 6
+        if is_v6 and value >> 32 == 0xFFFF:
+            value, is_v6 = value & 0xFFFFFFFF, False  # IPv4-mapped IPv6
+        if not is_v6:
+            starts, ends, country = self._v4
+            # A uint32 needle keeps searchsorted from upcasting the whole array per call.
+            position = int(np.searchsorted(starts, np.uint32(value), side="right")) - 1
+            if position >= 0 and value <= ends[position]:
+                return self.countries[country[position]]
+            return None
+        starts, ends, country = self._v6
+        position = bisect.bisect_right(starts, value) - 1
+        if position >= 0 and value <= ends[position]:
+            return self.countries[country[position]]
+        return None
+
+
+class RateTable:
+    """The exchange-rate file, re-read when its mtime changes."""
+
+    def __init__(self, path=RATES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked = 0.0
+        self.version = None
+        self.currencies = {}
+        self.document = {}
+
+    def _reload(self):
+        with open(self.path, "rb") as handle:
+            raw = handle.read()
+        document = json.loads(raw)
+        currencies = {code.upper(): dict(info, code=code.upper()) for code, info in document["currencies"].items()}
+        self.version = hashlib.blake2b(raw, digest_size=6).hexdigest()
+        self.currencies = currencies
+        self.document = {"base": document.get("base", "USD"), "version": self.version, "currencies": currencies}
+
+    def current(self):
+        now = time.monotonic()
+        if self.version is not None and now - self._checked < RATES_RELOAD_SECONDS:
+            return self
+        with self._lock:
+            self._checked = now
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime != self._mtime:
+                self._reload()
+                self._mtime = mtime
+        return self
+
+    def rate(self, code):
+        info = self.current().currencies.get(code.upper())
+        if info is None:
+            raise KeyError(code)
+        return float(info["rate"])
+
+
+geoip = GeoIPTable()
+rates = RateTable()
+
+
+def client_address(request):
+    # Behind a proxy the first X-Forwarded-For hop is the visitor. It can be spoofed,
+    # which only lets a client choose its own default currency.
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else ""
+
+
+def detect_country(request):
+    """(country code or None, source) for a request."""
+    for header in COUNTRY_HEADERS:
+        value = request.headers.get(header, "").strip().upper()
+        if len(value) == 2 and value.isalpha() and value not in ("XX", "T1"):
+            return value, "header"
+    country = geoip.lookup(client_address(request))
+    if country is not None:
+        return country, "geoip"
+    return None, "default"
+
+
+def format_amount(amount, info):
+    """Symbol-prefixed, grouped, no decimals: the frontend's formatPrice() without Intl."""
+    return f"{info['symbol']}{round(amount):,}"
+
+
+def convert(amounts, source, target):
+    """Convert an array of amounts between currencies, rounded to the target's decimals."""
+    table = rates.current()
+    factor = table.rate(target) / table.rate(source)
+    return np.round(np.asarray(amounts, dtype=np.float64) * factor, table.currencies[target]["decimals"])
+
+
+def price_ranges(target):
+    info = rates.current().currencies[target]
+    converted = np.rint(PRICE_RANGES_USD * rates.rate(target))
+    return [{"label": format_amount(low, info) if low == high else
+             f"{format_amount(low, info)} - {format_amount(high, info)}",
+             "min": int(low), "max": int(high)} for low, high in converted.tolist()]
+
+
+router = APIRouter(tags=["currency"])
+
+
+class ConvertRequest(BaseModel):
+    prices: List[Annotated[float, Field(allow_inf_nan=False)]] = Field(default_factory=list, max_length=MAX_PRICES)
+    source: str = Field(DEFAULT_CURRENCY, alias="from", min_length=3, max_length=3)
+    to: Optional[str] = Field(None, min_length=3, max_length=3, description="Defaults to the visitor's currency")
+    ranges: bool = False
+
+
+@router.get("/api/locale")
+async def visitor_locale(request: Request, response: Response):
+    country, source = detect_country(request)
+    table = rates.current()
+    code = COUNTRY_TO_CURRENCY.get(country, DEFAULT_CURRENCY)
+    response.headers["Cache-Control"] = "private, max-age=3600"
+    return {
+        "country_code": country,
+        "source": source,
+        "currency": table.currencies.get(code) or table.currencies[DEFAULT_CURRENCY],
+        "rates_version": table.version,
+    }
+
+
+@router.get("/api/rates")
+async def exchange_rates(request: Request):
+    table = rates.current()
+    etag = f'"{table.version}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300, stale-while-revalidate=3600"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    body = json.dumps(table.document, ensure_ascii=False, separators=(",", ":"))
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.post("/api/prices/convert")
+async def convert_prices(body: ConvertRequest, request: Request):
+    table = rates.current()
+    target = body.to
+    if target is None:
+        country, _ = detect_country(request)
+        target = COUNTRY_TO_CURRENCY.get(country, DEFAULT_CURRENCY)
+    source, target = body.source.upper(), target.upper()
+    for code in (source, target):
+        if code not in table.currencies:
+            raise HTTPException(status_code=400, detail=f"Unknown currency {code}")
+    result = {
+        "from": source,
+        "currency": target,
+        "rate": table.rate(target) / table.rate(source),
+        "rates_version": table.version,
+        "prices": convert(body.prices, source, target).tolist(),
+    }
+    if body.ranges:
+        result["ranges"] = price_ranges(target)
+        result["max_price"] = int(round(MAX_PRICE_USD * table.rate(target)))
+    return result
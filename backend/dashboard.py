@@ -0,0 +1,57 @@
+"""``/api/dashboard/{role}``: the three Dashboard.tsx tables in one request.
+
+``stats``, ``activities`` and ``quick_actions`` are small, rarely edited
+content tables, so each role's bundle is cached for a short TTL and
+concurrent requests for the same role share a single fetch.
+"""
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, Path
+
+import datasource
+from auth import current_user
+
+TTL_SECONDS = 60.0
+ROLES = ("renter", "landlord", "agent", "admin")  # profiles.role values; also bounds the cache keys
+
+_cache = {}     # role -> (expires at, bundle)
+_inflight = {}  # role -> future for the fetch in progress
+
+
+def load_bundle(role):
+    return {
+        "role": role,
+        "stats": list(datasource.select_rows("stats", filters={"role": f"eq.{role}"})),
+        "activities": list(datasource.select_rows("activities")),
+        "quick_actions": list(datasource.select_rows("quick_actions", filters={"role": f"eq.{role}"})),
+    }
+
+
+async def get_bundle(role):
+    cached = _cache.get(role)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    pending = _inflight.get(role)
+    if pending is None:
+        pending = _inflight[role] = asyncio.get_running_loop().run_in_executor(None, load_bundle, role)
+        try:
+            bundle = await pending
+            now = time.monotonic()
+            for stale in [key for key, (expires, _) in _cache.items() if expires <= now]:
+                del _cache[stale]
+            _cache[role] = (now + TTL_SECONDS, bundle)
+        finally:
+            del _inflight[role]
+        return bundle
+    return await asyncio.shield(pending)
+
+
+router = APIRouter(tags=["dashboard"])
+
+
+@router.get("/api/dashboard/{role}", dependencies=[Depends(current_user)])
+async def dashboard(role: str = Path(..., pattern=f"^({'|'.join(ROLES)})$")):
+    if not datasource.is_configured():
+        return {"role": role, "stats": [], "activities": [], "quick_actions": []}
+    return await get_bundle(role)
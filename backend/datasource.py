@@ -0,0 +1,167 @@
+"""PostgREST access to Supabase tables for the in-memory indexes.
+
+Supabase remains the system of record. The API mirrors the tables it needs
+and keeps them fresh by polling on a change timestamp, so every endpoint can
+answer from memory. The few writes the API makes go straight to PostgREST.
+"""
+import asyncio
+import json
+import logging
+import os
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+logger = logging.getLogger("mmhub.datasource")
+
+SUPABASE_URL = os.getenv("SUPABASE_URL", "").rstrip("/")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY", "")
+PAGE_SIZE = 1000
+
+
+def is_configured():
+    return bool(SUPABASE_URL and SUPABASE_KEY)
+
+
+def _headers(token=None):
+    return {
+        "apikey": SUPABASE_KEY,
+        "Authorization": f"Bearer {token or SUPABASE_KEY}",
+        "Accept": "application/json",
+    }
+
+
+def _get_json(path, params=None, token=None):
+    query = f"?{urllib.parse.urlencode(params)}" if params else ""
+    request = urllib.request.Request(f"{SUPABASE_URL}{path}{query}", headers=_headers(token))
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)
+
+
+def _send_json(method, path, params=None, body=None):
+    query = f"?{urllib.parse.urlencode(params)}" if params else ""
+    headers = dict(_headers(), **{"Content-Type": "application/json", "Prefer": "return=representation"})
+    request = urllib.request.Request(f"{SUPABASE_URL}{path}{query}", data=json.dumps(body).encode(),
+                                     headers=headers, method=method)
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)
+
+
+def insert_rows(table, rows):
+    """Insert ``rows`` in one request and return them as stored (with ids and defaults)."""
+    return _send_json("POST", f"/rest/v1/{table}", body=rows)
+
+
+def update_rows(table, filters, values):
+    """Apply ``values`` to every row matching PostgREST ``filters``; returns the updated rows."""
+    return _send_json("PATCH", f"/rest/v1/{table}", params=filters, body=values)
+
+
+def select_rows(table, columns="*", filters=None, order="id.asc", limit=None):
+    """Yield rows of ``table`` matching PostgREST ``filters`` (e.g. ``{"role": "eq.renter"}``).
+
+    Without ``limit`` every matching row is fetched, a page at a time.
+    """
+    page_size = min(limit, PAGE_SIZE) if limit else PAGE_SIZE
+    params = dict(filters or {}, select=columns, order=order, limit=str(page_size))
+    offset = 0
+    while True:
+        params["offset"] = str(offset)
+        page = _get_json(f"/rest/v1/{table}", params)
+        yield from page
+        offset += len(page)
+        if len(page) < page_size or (limit and offset >= limit):
+            return
+
+
+def fetch_rows(table, columns="*", since=None, cursor_column="updated_at", filters=None):
+    """Yield rows of ``table`` ordered by ``cursor_column``, optionally only those changed since ``since``."""
+    filters = dict(filters or {})
+    if since is not None:
+        # gte rather than gt: rows committed with the same timestamp after the
+        # last poll would otherwise be skipped. Re-applying a row is harmless.
+        filters[cursor_column] = f"gte.{since}"
+    return select_rows(table, columns, filters, order=f"{cursor_column}.asc,id.asc")
+
+
+def fetch_user(token):
+    """Resolve a Supabase access token to its auth user, or raise ``urllib.error.HTTPError``."""
+    return _get_json("/auth/v1/user", token=token)
+
+
+def parse_timestamp(value):
+    """Parse a PostgREST timestamp into epoch seconds (0.0 when missing)."""
+    if not value:
+        return 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class TableFeed:
+    """Polls one table for changed rows and hands them to subscribed indexes.
+
+    Listeners are called as ``listener(rows, reset)``. ``reset`` is true for a
+    full snapshot, after which the listener should drop rows it did not see
+    (this is how deletions propagate, since they leave no change timestamp).
+    """
+
+    def __init__(self, table, columns="*", cursor_column="updated_at",
+                 filters=None, interval=30.0, resync_interval=600.0, fetch=None):
+        self.table = table
+        self.columns = columns
+        self.filters = filters
+        self.cursor_column = cursor_column
+        self.interval = interval
+        self.resync_interval = resync_interval
+        self._fetch = fetch or fetch_rows
+        self._listeners = []
+        self._watermark = None
+        self._watermark_at = 0.0
+        self._at_watermark = set()   # ids of rows already applied at the watermark timestamp
+        self._since_resync = 0.0
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        return listener
+
+    def poll(self, reset=False):
+        """Fetch changes since the last poll and notify listeners. Returns the row count."""
+        reset = reset or self._watermark is None
+        since = None if reset else self._watermark
+        rows = list(self._fetch(self.table, self.columns, since, self.cursor_column, self.filters))
+        if not reset:
+            # The gte filter hands back the rows at the watermark every time; skip the ones already applied.
+            rows = [row for row in rows if row.get("id") not in self._at_watermark
+                    or parse_timestamp(row.get(self.cursor_column)) != self._watermark_at]
+        if reset:
+            self._at_watermark = set()
+        if rows:
+            stamps = [parse_timestamp(row.get(self.cursor_column)) for row in rows]
+            latest = max(stamps)
+            if latest > self._watermark_at or reset:
+                self._watermark = rows[stamps.index(latest)].get(self.cursor_column) or self._watermark
+                self._watermark_at = latest
+                self._at_watermark = set()
+            if latest == self._watermark_at:
+                self._at_watermark.update(row.get("id") for row, stamp in zip(rows, stamps) if stamp == latest)
+        if rows or reset:
+            for listener in self._listeners:
+                listener(rows, reset)
+        return len(rows)
+
+    async def run(self):
+        """Poll forever, taking a full snapshot every ``resync_interval`` seconds."""
+        loop = asyncio.get_running_loop()
+        while True:
+            reset = self._watermark is None or self._since_resync >= self.resync_interval
+            try:
+                count = await loop.run_in_executor(None, self.poll, reset)
+                if reset:
+                    self._since_resync = 0.0
+                if count:
+                    logger.info("%s: applied %d row(s)%s", self.table, count, " (full)" if reset else "")
+            except Exception:
+                logger.exception("%s: refresh failed", self.table)
+            await asyncio.sleep(self.interval)
+            self._since_resync += self.interval
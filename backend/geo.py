@@ -0,0 +1,228 @@
+"""Offline reverse geocoding and nearby-listing search.
+
+Replaces the browser's calls to Nominatim/OpenCage/Mapbox with lookups
+against the bundled gazetteer, and gives "properties near me" real
+distances instead of a substring match on ``location``. Points are bucketed
+into a fixed lat/lon grid kept sorted by cell, so a radius query only
+computes haversine distances for the cells the circle overlaps.
+"""
+import functools
+import math
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+
+from location_suggest import normalize, place_components, read_gazetteer
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180   # on the sphere the distances use
+CELL_DEGREES = 0.01       # ~1.1 km grid cells
+CACHE_PRECISION = 3       # cache key rounding, ~110 m
+CACHE_SIZE = 8192
+MAX_RADIUS_KM = 200.0
+MAX_REVERSE_KM = 50.0     # farther than this from any gazetteer place is "unknown", not the nearest town
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distance from one point to arrays of points."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (np.sin((lats - lat) / 2) ** 2
+         + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GridIndex:
+    """Points sorted by grid cell; each lat row of a query box is one contiguous slice."""
+
+    LON_CELLS = int(math.ceil(360 / CELL_DEGREES))
+
+    def __init__(self, keys=(), lats=(), lons=()):
+        self.keys = np.asarray(keys, dtype=object)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        cells = self._cells(lats, lons)
+        order = np.argsort(cells, kind="stable")
+        self.cells = cells[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.keys = self.keys[order]
+
+    def __len__(self):
+        return self.cells.size
+
+    @classmethod
+    def _cells(cls, lats, lons):
+        rows = np.floor((np.asarray(lats) + 90) / CELL_DEGREES).astype(np.int64)
+        cols = np.floor((np.asarray(lons) + 180) / CELL_DEGREES).astype(np.int64)
+        return rows * cls.LON_CELLS + cols
+
+    def within(self, lat, lon, radius_km):
+        """Return (positions, distances) of points within ``radius_km``, nearest first."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        angle = radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        # Exact longitude half-width of a spherical cap; d / cos(lat) undershoots off the equator.
+        cos_lat = math.cos(math.radians(lat))
+        if abs(lat) + dlat >= 90 or math.sin(angle) >= cos_lat:
+            dlon = 180.0
+        else:
+            dlon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+        row_lo = int(math.floor((lat - dlat + 90) / CELL_DEGREES))
+        row_hi = int(math.floor((lat + dlat + 90) / CELL_DEGREES))
+        col_lo = int(math.floor((max(lon - dlon, -180) + 180) / CELL_DEGREES))
+        col_hi = int(math.floor((min(lon + dlon, 180) + 180) / CELL_DEGREES))
+        rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.LON_CELLS
+        starts = np.searchsorted(self.cells, rows + col_lo, side="left")
+        ends = np.searchsorted(self.cells, rows + col_hi, side="right")
+        spans = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        if not spans:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        candidates = np.concatenate(spans)
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+    def nearest(self, lat, lon, k):
+        """k nearest points, found by growing the search radius until k lie inside it."""
+        radius = CELL_DEGREES * KM_PER_DEGREE
+        while True:
+            positions, distances = self.within(lat, lon, radius)
+            if positions.size >= k or positions.size == len(self) or radius >= 2 * math.pi * EARTH_RADIUS_KM:
+                return positions[:k], distances[:k]
+            radius *= 2
+
+
+class Gazetteer:
+    def __init__(self, records=None):
+        records = records if records is not None else read_gazetteer()
+        self.records = [record for record in records if record.get("latitude") and record.get("longitude")]
+        self.by_place = {}
+        for record in self.records:
+            self.by_place.setdefault(normalize(record["name"].split(",")[0]), record)
+        self.grid = GridIndex(
+            range(len(self.records)),
+            [float(record["latitude"]) for record in self.records],
+            [float(record["longitude"]) for record in self.records],
+        )
+        self.reverse = functools.lru_cache(maxsize=CACHE_SIZE)(self._reverse)
+
+    def locate(self, location):
+        """Approximate coordinates for a free-form address from its most specific known place."""
+        for place, _ in place_components(location):
+            record = self.by_place.get(normalize(place))
+            if record is not None:
+                return float(record["latitude"]), float(record["longitude"])
+        return None
+
+    def _reverse(self, lat, lon):
+        positions, distances = self.grid.nearest(lat, lon, 1)
+        if not positions.size or distances[0] > MAX_REVERSE_KM:
+            return None
+        record = self.records[self.grid.keys[positions[0]]]
+        district = record["name"].split(",")[0] if record["type"] != "city" else None
+        return {
+            "latitude": lat,
+            "longitude": lon,
+            "address": record["name"],
+            "city": record["province"],
+            "district": district,
+            "country": "Thailand",
+            "distance_km": round(float(distances[0]), 3),
+        }
+
+
+class ListingLocator:
+    """Coordinates of every listing, from latitude/longitude columns or the gazetteer."""
+
+    def __init__(self, gazetteer):
+        self._lock = threading.RLock()
+        self._gazetteer = gazetteer
+        self._points = {}   # property id -> (lat, lon, approximate, row)
+        self._grid = GridIndex()
+        self._cached_query = functools.lru_cache(maxsize=CACHE_SIZE)(self._query)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _point(self, row):
+        lat, lon = row.get("latitude"), row.get("longitude")
+        if lat is not None and lon is not None:
+            return float(lat), float(lon), False
+        located = self._gazetteer.locate(row.get("location"))
+        if located is None:
+            return None
+        return located[0], located[1], True
+
+    def apply(self, rows, reset=False):
+        """``TableFeed`` listener for ``properties``.
+
+        The points and grid are rebuilt here, in the feed's worker thread, and
+        swapped in, so ``/nearby`` never waits on a rebuild. Only the feed
+        writes ``_points``, so copying it without the lock is safe.
+        """
+        points = {} if reset else dict(self._points)
+        for row in rows:
+            point = self._point(row)
+            if point is None:
+                points.pop(row["id"], None)
+            else:
+                points[row["id"]] = point + (row,)
+        ids = list(points)
+        grid = GridIndex(ids, [points[i][0] for i in ids], [points[i][1] for i in ids])
+        with self._lock:
+            self._points, self._grid = points, grid
+            self._cached_query.cache_clear()
+
+    def _query(self, lat, lon, radius_km, limit):
+        grid = self._grid
+        if radius_km is None:
+            positions, distances = grid.nearest(lat, lon, limit)
+            total = int(positions.size)
+        else:
+            positions, distances = grid.within(lat, lon, radius_km)
+            total = int(positions.size)
+            positions, distances = positions[:limit], distances[:limit]
+        items = []
+        for position, distance in zip(positions, distances):
+            _, _, approximate, row = self._points[grid.keys[position]]
+            items.append(dict(row, distance_km=round(float(distance), 3), approximate_location=approximate))
+        return total, tuple(items)
+
+    def nearby(self, lat, lon, radius_km=None, limit=20):
+        key = (round(lat, CACHE_PRECISION), round(lon, CACHE_PRECISION))
+        with self._lock:
+            total, items = self._cached_query(key[0], key[1], radius_km, limit)
+        return {"items": list(items), "total": total}
+
+
+gazetteer = Gazetteer()
+listings = ListingLocator(gazetteer)
+router = APIRouter(tags=["geo"])
+
+
+@router.get("/api/geo/reverse")
+async def reverse_geocode(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    result = gazetteer.reverse(round(lat, CACHE_PRECISION), round(lon, CACHE_PRECISION))
+    if result is None:
+        raise HTTPException(status_code=404, detail="No known place near these coordinates")
+    return result
+
+
+@router.get("/api/properties/nearby")
+async def nearby_properties(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0, le=MAX_RADIUS_KM, description="Omit for k-nearest"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    started = time.perf_counter()
+    result = listings.nearby(lat, lon, radius_km, limit)
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
@@ -0,0 +1,398 @@
+"""Listing image variants behind ``/api/images/{hash}``.
+
+Listing cards used to download the full-size original from ``images`` even
+for a 400px card. Originals are now stored under their content hash. Resized
+WebP/JPEG variants are rendered in a process pool, one width bucket at a
+time, so any ``w`` maps onto a handful of files per image. Variants live in
+an on-disk cache evicted least-recently-used by total size. Because a hash
+and its rendering parameters fully determine the bytes, responses carry
+strong ETags and an immutable Cache-Control. Originals are never evicted.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+from PIL import Image, ImageOps
+
+from auth import current_user
+
+WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+FORMATS = {
+    # name: (Pillow format, media type, save options)
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+RENDER_VERSION = 1         # bump when save options change so ETags change with the bytes
+ACCEPTED_FORMATS = {"JPEG", "MPO", "PNG", "WEBP", "GIF"}
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024
+MAX_PIXELS = 60_000_000
+HASH_PATTERN = "^[0-9a-f]{32}$"
+CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".image-cache"))
+CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def width_bucket(requested, original_width):
+    """Smallest bucket at least ``requested`` wide, never wider than the original."""
+    for width in WIDTHS:
+        if width >= requested:
+            return min(width, original_width)
+    return min(WIDTHS[-1], original_width)
+
+
+def display_size(image):
+    """(width, height) after EXIF orientation is applied."""
+    return image.size[::-1] if image.getexif().get(0x0112) in (5, 6, 7, 8) else image.size
+
+
+def render_variant(source, target, width, fmt):
+    """Resize ``source`` to ``width`` and write it to ``target``; runs in a pool worker."""
+    pillow_format, _, options = FORMATS[fmt]
+    with Image.open(source) as image:
+        src_width, src_height = display_size(image)
+        height = max(1, round(src_height * width / src_width))
+        # Let the JPEG decoder downscale by a power of two before we resample.
+        image.draft("RGB", (width, height) if image.size == (src_width, src_height) else (height, width))
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if image.mode not in ("RGB", "RGBA") or (pillow_format == "JPEG" and image.mode == "RGBA"):
+            if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+                image = image.convert("RGBA")
+                if pillow_format == "JPEG":
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+            else:
+                image = image.convert("RGB")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{os.getpid()}.tmp"
+        image.save(partial, pillow_format, **options)
+    os.replace(partial, target)
+    return os.path.getsize(target)
+
+
+class DiskCache:
+    """Files under ``root`` with a total size budget, evicted least recently used first."""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()   # path -> size, least recently used first
+        self.total_bytes = 0
+        self._loaded = False
+
+    def _load(self):
+        # Recency survives restarts only as well as atime does; good enough to seed the order.
+        found = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_atime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self.total_bytes += size
+        self._loaded = True
+
+    def get(self, path):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            size = self._entries.get(path)
+            if size is not None:
+                if not os.path.exists(path):
+                    self._forget(path)
+                    return None
+                self._entries.move_to_end(path)
+            return size
+
+    def add(self, path, size):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._forget(path)
+            self._entries[path] = size
+            self.total_bytes += size
+            self._evict()
+
+    def _forget(self, path):
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self.total_bytes -= size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class ImageStore:
+    def __init__(self, root=CACHE_DIR, max_cache_bytes=CACHE_MAX_BYTES, workers=None):
+        self.root = root
+        self.cache = DiskCache(os.path.join(root, "variants"), max_cache_bytes)
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._lock = threading.RLock()
+        self._inflight = {}   # variant path -> future for the render in progress
+        self._dimensions = {}
+        self._sources = None  # source URL -> hash, from sources.jsonl
+        self._sources_stamp = None  # (mtime, size) of sources.jsonl when it was read
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the API process has feed and executor threads running
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    # -- originals ---------------------------------------------------------
+
+    def original_path(self, digest):
+        return os.path.join(self.root, "originals", digest[:2], digest)
+
+    def variant_path(self, digest, width, fmt):
+        return os.path.join(self.cache.root, digest[:2], f"{digest}-{width}-v{RENDER_VERSION}.{fmt}")
+
+    def ingest(self, data):
+        """Store an uploaded original under its content hash; returns (hash, width, height)."""
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise ValueError(f"Images are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MiB")
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.verify()  # must come straight after open, so read the header again below
+            with Image.open(io.BytesIO(data)) as image:
+                if image.format not in ACCEPTED_FORMATS:
+                    raise ValueError(f"Unsupported image format {image.format}")
+                size = display_size(image)
+        except (OSError, Image.DecompressionBombError):
+            raise ValueError("Not a readable image") from None
+        digest = content_hash(data)
+        path = self.original_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            partial = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(partial, "wb") as out:
+                out.write(data)
+            os.replace(partial, path)
+        self._dimensions[digest] = size
+        return digest, size[0], size[1]
+
+    def dimensions(self, digest):
+        """(width, height) of the original as displayed, or None if it was never ingested."""
+        size = self._dimensions.get(digest)
+        if size is None:
+            try:
+                with Image.open(self.original_path(digest)) as image:
+                    size = display_size(image)
+            except FileNotFoundError:
+                return None
+            self._dimensions[digest] = size
+        return size
+
+    # -- source URLs -------------------------------------------------------
+
+    def _sources_file_stamp(self):
+        try:
+            st = os.stat(os.path.join(self.root, "sources.jsonl"))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _load_sources(self):
+        # Re-read when another process (pregenerate_images.py) has appended since.
+        stamp = self._sources_file_stamp()
+        if self._sources is None or stamp != self._sources_stamp:
+            sources = {}
+            try:
+                with open(os.path.join(self.root, "sources.jsonl")) as lines:
+                    for line in lines:
+                        entry = json.loads(line)
+                        sources[entry["url"]] = entry["hash"]
+            except FileNotFoundError:
+                pass
+            self._sources, self._sources_stamp = sources, stamp
+        return self._sources
+
+    def remember_source(self, url, digest):
+        with self._lock:
+            sources = self._load_sources()
+            if sources.get(url) == digest:
+                return
+            sources[url] = digest
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, "sources.jsonl"), "a") as out:
+                out.write(json.dumps({"url": url, "hash": digest}) + "\n")
+            self._sources_stamp = self._sources_file_stamp()
+
+    def resolve(self, url):
+        with self._lock:
+            return self._load_sources().get(url)
+
+    # -- variants ----------------------------------------------------------
+
+    def plan(self, digest, width, fmt):
+        """Bucketed width and cache path for a request, or None if the original is unknown."""
+        size = self.dimensions(digest)
+        if size is None:
+            return None
+        width = width_bucket(width or WIDTHS[-1], size[0])
+        return width, self.variant_path(digest, width, fmt)
+
+    async def variant(self, digest, width, fmt):
+        """Path of the rendered variant, rendering it once however many requests ask at the same time."""
+        planned = self.plan(digest, width, fmt)
+        if planned is None:
+            return None
+        width, path = planned
+        if self.cache.get(path) is not None:
+            return path
+        try:
+            # Rendered by another process (pregenerate_images.py) or before a restart
+            self.cache.add(path, os.stat(path).st_size)
+            return path
+        except FileNotFoundError:
+            pass
+        pending = self._inflight.get(path)
+        if pending is None:
+            loop = asyncio.get_running_loop()
+            pending = self._inflight[path] = loop.run_in_executor(
+                self.pool, render_variant, self.original_path(digest), path, width, fmt)
+            try:
+                self.cache.add(path, await pending)
+            finally:
+                del self._inflight[path]
+            return path
+        await asyncio.shield(pending)
+        return path
+
+    def srcset(self, digest, fmt="webp"):
+        size = self.dimensions(digest)
+        widths = sorted({width_bucket(width, size[0]) for width in WIDTHS})
+        return ", ".join(f"/api/images/{digest}?w={width}&fmt={fmt} {width}w" for width in widths)
+
+    def describe(self, digest):
+        width, height = self.dimensions(digest)
+        return {"hash": digest, "width": width, "height": height,
+                "srcset": {fmt: self.srcset(digest, fmt) for fmt in FORMATS}}
+
+
+store = ImageStore()
+router = APIRouter(tags=["images"])
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single ``bytes=`` range, None to ignore, ValueError if unsatisfiable."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if match is None or match.groups() == ("", ""):
+        return None  # multi-range or malformed: serve the whole file
+    first, last = match.groups()
+    if first == "":
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+@router.post("/api/images")
+async def upload_image(request: Request, user=Depends(current_user)):
+    """Ingest a raw image body (``Content-Type: image/*``) and return its hash and srcsets."""
+    too_large = HTTPException(status_code=413, detail=f"Images are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MiB")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES:
+        raise too_large
+    # Read with a cap so a missing or false Content-Length cannot buffer an unbounded body.
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > MAX_UPLOAD_BYTES:
+            raise too_large
+    data = bytes(data)
+    try:
+        digest, _, _ = await asyncio.get_running_loop().run_in_executor(None, store.ingest, data)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return store.describe(digest)
+
+
+@router.get("/api/images/resolve")
+async def resolve_image(url: str = Query(..., max_length=2048)):
+    """Hash and srcsets for an ``images`` URL that has been pre-generated."""
+    digest = store.resolve(url)
+    if digest is None or store.dimensions(digest) is None:
+        raise HTTPException(status_code=404, detail="Image has not been ingested")
+    return store.describe(digest)
+
+
+@router.get("/api/images/{digest}")
+async def image_variant(
+    request: Request,
+    digest: str,
+    w: Optional[int] = Query(None, ge=16, le=4096, description="Requested width; rounded up to a bucket"),
+    fmt: str = Query("auto", pattern="^(auto|webp|jpeg)$"),
+):
+    if not re.fullmatch(HASH_PATTERN, digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    headers = {"Cache-Control": IMMUTABLE, "Accept-Ranges": "bytes"}
+    if fmt == "auto":
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+        headers["Vary"] = "Accept"
+    path = await store.variant(digest, w, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    headers["ETag"] = '"' + os.path.basename(path) + '"'
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    media_type = FORMATS[fmt][1]
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", headers["ETag"]) == headers["ETag"]:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers=dict(headers, **{"Content-Range": f"bytes */{size}"}))
+        if byte_range is not None:
+            start, end = byte_range
+            with open(path, "rb") as variant:
+                variant.seek(start)
+                body = variant.read(end - start + 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(body, status_code=206, media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -0,0 +1,249 @@
+"""Location autocomplete backed by a prefix trie.
+
+The trie is built from the bundled gazetteer (``data/thailand_locations.csv``,
+the list ``src/utils/locationSuggestions.ts`` used to scan on every keystroke)
+plus the places that actually appear in ``properties.location``. Every word
+boundary of a name is a key, so "lo" finds "Thong Lo", and lookups tolerate a
+bounded number of typos. Ranking favours closer matches, cities over
+districts, and places with more listings.
+"""
+import csv
+import functools
+import math
+import os
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Query
+
+from property_search import tokenize
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "thailand_locations.csv")
+TYPE_PRIORITY = {"city": 3.0, "district": 2.0, "station": 1.5, "area": 1.0}
+CACHE_SIZE = 4096
+DEFAULT_LIMIT = 8
+MAX_QUERY_LENGTH = 64  # the typo walk costs O(query length x trie nodes)
+
+_ENTRIES = ""  # trie node key holding (entry id, key weight) pairs
+
+
+def normalize(text):
+    return " ".join(tokenize(text))
+
+
+def read_gazetteer(path=GAZETTEER_PATH):
+    with open(path, newline="", encoding="utf-8") as handle:
+        return list(csv.DictReader(handle))
+
+
+def max_typos(query):
+    """Allowed edit distance grows with query length; short prefixes must match exactly."""
+    if len(query) < 4:
+        return 0
+    return 1 if len(query) < 8 else 2
+
+
+def place_components(location):
+    """Split a free-form listing address into (place, province) candidates.
+
+    "456 Beach Road, Patong, Phuket 83150" -> [("Patong", "Phuket"), ("Phuket", "Phuket")].
+    Components that start with a house number are street addresses and are skipped.
+    """
+    parts = [part.strip() for part in (location or "").split(",") if part.strip()]
+    places = []
+    for part in parts:
+        if part[0].isdigit():
+            continue
+        cleaned = " ".join(word for word in part.split() if not word.isdigit())
+        if cleaned:
+            places.append(cleaned)
+    if not places:
+        return []
+    province = places[-1]
+    return [(place, province) for place in places]
+
+
+class LocationEntry:
+    __slots__ = ("id", "name", "type", "province", "listings", "gazetteer")
+
+    def __init__(self, entry_id, name, type_, province, gazetteer):
+        self.id = entry_id
+        self.name = name
+        self.type = type_
+        self.province = province
+        self.listings = 0
+        self.gazetteer = gazetteer
+
+    def as_dict(self):
+        return {"name": self.name, "type": self.type, "province": self.province, "listings": self.listings}
+
+
+class LocationSuggester:
+    def __init__(self, gazetteer_path=GAZETTEER_PATH):
+        self._lock = threading.RLock()
+        self._gazetteer_path = gazetteer_path
+        self._cached_suggest = functools.lru_cache(maxsize=CACHE_SIZE)(self._suggest)
+        self._reset()
+
+    def _reset(self):
+        self._root = {}
+        self._entries = []
+        self._by_place = {}            # normalized gazetteer place -> entry id
+        self._learned = {}             # (normalized place, normalized province) -> entry id
+        self._listing_places = {}      # property id -> tuple of entry ids it contributes to
+        for record in read_gazetteer(self._gazetteer_path):
+            self._add_entry(record["name"], record["type"], record["province"], gazetteer=True)
+
+    # -- index maintenance -------------------------------------------------
+
+    def _insert_key(self, key, entry_id, weight):
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault(_ENTRIES, []).append((entry_id, weight))
+
+    def _add_entry(self, name, type_, province, gazetteer=False):
+        entry = LocationEntry(len(self._entries), name, type_, province, gazetteer)
+        self._entries.append(entry)
+        # "Thong Lo, Bangkok" is indexed under its place name "thong lo".
+        place = normalize(name.split(",")[0])
+        if gazetteer:
+            self._by_place.setdefault(place, entry.id)
+        words = place.split()
+        for position in range(len(words)):
+            self._insert_key(" ".join(words[position:]), entry.id, 2 if position == 0 else 1)
+        province_key = normalize(province)
+        if province_key and province_key != place:
+            self._insert_key(province_key, entry.id, 0)
+            # The suggestion's own label ("Sukhumvit, Bangkok"), which the input holds after a pick
+            self._insert_key(f"{place} {province_key}", entry.id, 2)
+        return entry
+
+    def _entry_for_place(self, place, province):
+        key = normalize(place)
+        entry_id = self._by_place.get(key)
+        if entry_id is None:
+            learned_key = (key, normalize(province))
+            entry_id = self._learned.get(learned_key)
+            if entry_id is None:
+                display = place if learned_key[1] == key else f"{place}, {province}"
+                entry_id = self._learned[learned_key] = self._add_entry(display, "area", province).id
+        return entry_id
+
+    def _upsert_listing(self, row):
+        property_id = row["id"]
+        for entry_id in self._listing_places.pop(property_id, ()):
+            self._entries[entry_id].listings -= 1
+        entry_ids = {self._entry_for_place(place, province)
+                     for place, province in place_components(row.get("location"))}
+        for entry_id in entry_ids:
+            self._entries[entry_id].listings += 1
+        self._listing_places[property_id] = tuple(entry_ids)
+
+    def apply(self, rows, reset=False):
+        """``TableFeed`` listener for ``properties``: learns new places and listing counts."""
+        if reset:
+            # Build the new trie off-lock so suggest() keeps answering from the old one.
+            fresh = LocationSuggester(self._gazetteer_path)
+            for row in rows:
+                fresh._upsert_listing(row)
+            state = vars(fresh)
+            for name in ("_lock", "_cached_suggest"):
+                state.pop(name)
+            with self._lock:
+                vars(self).update(state)
+                self._cached_suggest.cache_clear()
+            return
+        with self._lock:
+            for row in rows:
+                self._upsert_listing(row)
+            self._cached_suggest.cache_clear()
+
+    # -- querying ----------------------------------------------------------
+
+    def _matches(self, query, typos):
+        """Map entry id -> (edit distance, key weight) for keys that ``query`` prefixes within ``typos`` edits."""
+        found = {}
+
+        def collect(node, distance):
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                for entry_id, weight in current.get(_ENTRIES, ()):
+                    best = found.get(entry_id)
+                    if best is None or (distance, -weight) < (best[0], -best[1]):
+                        found[entry_id] = (distance, weight)
+                stack.extend(child for char, child in current.items() if char != _ENTRIES)
+
+        # Edit-distance rows (adjacent transpositions count as one edit) over
+        # the trie; ``best`` is the closest the whole query has come to
+        # matching a prefix on the current path.
+        stack = [(self._root, list(range(len(query) + 1)), None, "", typos + 1)]
+        while stack:
+            node, row, previous_row, previous_char, best = stack.pop()
+            best = min(best, row[-1])
+            if min(row) > typos:
+                if best <= typos:
+                    collect(node, best)
+                continue
+            for entry_id, weight in node.get(_ENTRIES, ()):
+                if best <= typos:
+                    previous = found.get(entry_id)
+                    if previous is None or (best, -weight) < (previous[0], -previous[1]):
+                        found[entry_id] = (best, weight)
+            for char, child in node.items():
+                if char == _ENTRIES:
+                    continue
+                next_row = [row[0] + 1]
+                for i, query_char in enumerate(query, 1):
+                    cost = min(row[i] + 1, next_row[i - 1] + 1, row[i - 1] + (query_char != char))
+                    if (i > 1 and previous_row is not None and query_char == previous_char
+                            and query[i - 2] == char):
+                        cost = min(cost, previous_row[i - 2] + 1)
+                    next_row.append(cost)
+                stack.append((child, next_row, row, char, best))
+        return found
+
+    def _rank(self, entry, distance, weight):
+        return (-3.0 * distance + weight + TYPE_PRIORITY.get(entry.type, 0.0)
+                + math.log1p(max(entry.listings, 0)))
+
+    def _suggest(self, query, limit):
+        if len(query) < 2:
+            ranked = [entry for entry in self._entries if entry.type == "city"]
+            ranked.sort(key=lambda entry: -entry.listings)
+            return tuple(entry.as_dict() for entry in ranked[:limit])
+
+        scored = []
+        for entry_id, (distance, weight) in self._matches(query, max_typos(query)).items():
+            entry = self._entries[entry_id]
+            if not entry.gazetteer and entry.listings <= 0:
+                continue
+            scored.append((-self._rank(entry, distance, weight), entry.name, entry))
+        scored.sort(key=lambda item: item[:2])
+        return tuple(entry.as_dict() for _, _, entry in scored[:limit])
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        with self._lock:
+            return list(self._cached_suggest(normalize(query), limit))
+
+    def cache_info(self):
+        return self._cached_suggest.cache_info()
+
+
+suggester = LocationSuggester()
+router = APIRouter(prefix="/api/locations", tags=["locations"])
+
+
+@router.get("/suggest")
+async def suggest_locations(
+    q: Optional[str] = Query("", max_length=MAX_QUERY_LENGTH, description="What the user has typed so far"),
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=25),
+):
+    started = time.perf_counter()
+    suggestions = suggester.suggest(q or "", limit)
+    return {
+        "suggestions": suggestions,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
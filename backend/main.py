@@ -1,6 +1,25 @@
+import asyncio
+import math
+import os
+
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+import admin_summary
+import currency
+import dashboard
+import datasource
+import geo
+import images
+import location_suggest
+import messaging
+import metrics
+import property_search
+import tours
 
 # Minimal FastAPI app for health checks and future custom endpoints
 app = FastAPI(
@@ -17,6 +36,71 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+def _finite(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    return value
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # The default handler echoes rejected input, and inf/NaN (e.g. JSON 1e400)
+    # cannot be encoded as strict JSON, which turned the 422 into a 500.
+    return JSONResponse(status_code=422, content={"detail": _finite(jsonable_encoder(exc.errors()))})
+
+app.include_router(property_search.router)
+app.include_router(location_suggest.router)
+app.include_router(geo.router)
+app.include_router(admin_summary.router)
+app.include_router(dashboard.router)
+app.include_router(messaging.router)
+app.include_router(images.router)
+app.include_router(currency.router)
+app.include_router(tours.router)
+app.include_router(metrics.router)
+
+# Tables mirrored in memory; each feed polls Supabase for changed rows.
+properties_feed = datasource.TableFeed("properties")
+properties_feed.subscribe(property_search.index.apply)
+properties_feed.subscribe(location_suggest.suggester.apply)
+properties_feed.subscribe(geo.listings.apply)
+properties_feed.subscribe(admin_summary.summary.apply_properties)
+properties_feed.subscribe(tours.schedule.apply_properties)
+profiles_feed = datasource.TableFeed("profiles", columns="id,user_type,role,updated_at")
+profiles_feed.subscribe(admin_summary.summary.apply_profiles)
+tour_requests_feed = datasource.TableFeed("tour_requests")
+tour_requests_feed.subscribe(admin_summary.summary.apply_tours)
+tour_requests_feed.subscribe(tours.schedule.apply)
+message_threads_feed = datasource.TableFeed("message_threads")
+message_threads_feed.subscribe(messaging.hub.apply_threads)
+unread_messages_feed = datasource.TableFeed("messages", columns=messaging.MESSAGE_COLUMNS,
+                                            cursor_column="created_at", filters={"is_read": "eq.false"},
+                                            interval=5.0)
+unread_messages_feed.subscribe(messaging.hub.apply_unread)
+feeds = [properties_feed, profiles_feed, tour_requests_feed, message_threads_feed, unread_messages_feed]
+feed_tasks = []
+
+
+@app.on_event("startup")
+async def start_feeds():
+    feed_tasks.append(metrics.start())
+    feed_tasks.append(messaging.hub.start())
+    feed_tasks.append(tours.schedule.start())
+    asyncio.get_running_loop().run_in_executor(None, currency.geoip.load)
+    if datasource.is_configured():
+        feed_tasks.extend(asyncio.create_task(feed.run()) for feed in feeds)
+
+
+@app.on_event("shutdown")
+async def stop_image_workers():
+    images.store.shutdown()
 
 @app.get("/")
 async def root():
@@ -35,4 +119,7 @@ async def health_check():
 
 if __name__ == "__main__":
     # Keep in sync with Vite proxy target in vite.config.ts
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Chat frames are short; per-message deflate would cost ~100 KiB of zlib state per socket
+    env_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, ws_per_message_deflate=False,
+                env_file=env_file if os.path.exists(env_file) else None)
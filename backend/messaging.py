@@ -0,0 +1,393 @@
+"""Real-time messaging hub behind ``/ws/messages``.
+
+Messages.tsx used to reload every thread and its whole history, and
+re-query ``messages`` for unread counts, with nothing pushed to the browser.
+The hub keeps per-user unread message ids in memory, so badge counts need no
+query. New messages fan out to every open socket of both participants, and
+read receipts fan out to sockets watching the thread. Reads are coalesced and
+written back to ``messages.is_read`` in batches. History is served a page at
+a time by message id (``before=<id>&limit=``).
+
+Each socket has a bounded outbound queue. A client that stops reading is
+disconnected rather than allowed to grow server memory.
+"""
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+
+import datasource
+from auth import current_user, resolve_token
+
+logger = logging.getLogger("mmhub.messaging")
+
+QUEUE_SIZE = 256           # outbound events buffered per socket
+MAX_WATCHED_THREADS = 64   # thread subscriptions per socket
+MAX_CONTENT_LENGTH = 4000
+READ_FLUSH_SECONDS = 1.0
+LOCAL_HISTORY = 500        # messages kept per thread when Supabase is not configured
+MESSAGE_COLUMNS = "id,thread_id,sender_id,recipient_id,content,is_read,created_at"
+
+
+class Connection:
+    __slots__ = ("user_id", "websocket", "queue", "watching", "closed")
+
+    def __init__(self, user_id, websocket):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.watching = set()
+        self.closed = False
+
+    def push(self, text):
+        """Queue an already serialised event; False if the client has fallen too far behind."""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def drain(self):
+        while True:
+            text = await self.queue.get()
+            await self.websocket.send_text(text)
+
+
+def event(type_, **fields):
+    return json.dumps(dict(fields, type=type_), default=str, separators=(",", ":"))
+
+
+class MessagingHub:
+    def __init__(self):
+        self._loop = None
+        self._threads = {}                       # thread id -> thread row
+        self._user_threads = defaultdict(set)    # user id -> thread ids
+        self._connections = defaultdict(set)     # user id -> Connections
+        self._watchers = defaultdict(set)        # thread id -> Connections
+        self._unread = defaultdict(dict)         # user id -> {thread id: sorted unread message ids}
+        self._read_upto = {}                     # (user id, thread id) -> highest id marked read here
+        self._pending_reads = {}                 # (thread id, user id) -> highest id to persist
+        self._local_ids = itertools.count(1)
+        self._local_history = defaultdict(lambda: deque(maxlen=LOCAL_HISTORY))
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self):
+        """Bind to the running loop and start the read-receipt flusher."""
+        self._loop = asyncio.get_running_loop()
+        return asyncio.create_task(self._flush_reads_forever())
+
+    def _on_loop(self, callback, *args):
+        # Feed listeners run on executor threads; hub state is only touched on the loop.
+        if self._loop is None:
+            callback(*args)
+        else:
+            self._loop.call_soon_threadsafe(callback, *args)
+
+    # -- table feeds -------------------------------------------------------
+
+    def apply_threads(self, rows, reset=False):
+        """``TableFeed`` listener for ``message_threads``."""
+        self._on_loop(self._apply_threads, rows, reset)
+
+    def _apply_threads(self, rows, reset):
+        if reset:
+            self._threads.clear()
+            self._user_threads.clear()
+        for row in rows:
+            old = self._threads.get(row["id"])
+            if old is not None:
+                for participant in self.participants(old):
+                    self._user_threads[participant].discard(row["id"])
+            self._threads[row["id"]] = row
+            for participant in self.participants(row):
+                self._user_threads[participant].add(row["id"])
+
+    def apply_unread(self, rows, reset=False):
+        """``TableFeed`` listener for unread ``messages``; picks up messages not sent through the hub."""
+        self._on_loop(self._apply_unread, rows, reset)
+
+    def _apply_unread(self, rows, reset):
+        if reset:
+            self._unread.clear()
+        for row in rows:
+            if reset:
+                self._record_unread(row)
+            elif self._record_unread(row):
+                self._fan_out_message(row)
+        if reset:
+            for user_id in list(self._connections):
+                self._push_unread(user_id)
+
+    # -- state -------------------------------------------------------------
+
+    @staticmethod
+    def participants(thread):
+        return {p for p in (thread.get("participant_1"), thread.get("participant_2")) if p}
+
+    def is_participant(self, user_id, thread_id):
+        if not datasource.is_configured() and thread_id not in self._threads:
+            return True  # local development: threads are not mirrored
+        return thread_id in self._user_threads.get(user_id, ())
+
+    def _recipient(self, message):
+        if message.get("recipient_id"):
+            return message["recipient_id"]
+        thread = self._threads.get(message.get("thread_id"), {})
+        others = self.participants(thread) - {message.get("sender_id")}
+        return next(iter(others), None)
+
+    def _record_unread(self, message):
+        """Count a message as unread for its recipient; False if already known or already read."""
+        recipient, thread_id = self._recipient(message), message.get("thread_id")
+        if recipient is None or thread_id is None or recipient == message.get("sender_id"):
+            return False
+        if message["id"] <= self._read_upto.get((recipient, thread_id), 0):
+            return False
+        ids = self._unread[recipient].setdefault(thread_id, [])
+        position = bisect.bisect_left(ids, message["id"])
+        if position < len(ids) and ids[position] == message["id"]:
+            return False
+        ids.insert(position, message["id"])
+        return True
+
+    def unread_counts(self, user_id):
+        return {thread_id: len(ids) for thread_id, ids in self._unread.get(user_id, {}).items() if ids}
+
+    def threads_for(self, user_id):
+        threads = [dict(self._threads[thread_id], unread=len(self._unread.get(user_id, {}).get(thread_id, ())))
+                   for thread_id in self._user_threads.get(user_id, ())]
+        threads.sort(key=lambda thread: thread.get("updated_at") or "", reverse=True)
+        return threads
+
+    # -- fan-out -----------------------------------------------------------
+
+    def _send(self, connections, text):
+        for connection in list(connections):
+            if not connection.push(text):
+                logger.warning("dropping slow messaging client for user %s", connection.user_id)
+                self.disconnect(connection)
+                asyncio.ensure_future(connection.websocket.close(code=1013))
+
+    def _push_unread(self, user_id, thread_id=None):
+        counts = self.unread_counts(user_id)
+        self._send(self._connections.get(user_id, ()), event(
+            "unread", thread_id=thread_id, count=counts.get(thread_id, 0) if thread_id is not None else None,
+            total=sum(counts.values()), threads=counts if thread_id is None else None,
+        ))
+
+    def _fan_out_message(self, message):
+        text = event("message", message=message)
+        recipients = self.participants(self._threads.get(message["thread_id"], {}))
+        recipients |= {message.get("sender_id"), self._recipient(message)} - {None}
+        for user_id in recipients:
+            self._send(self._connections.get(user_id, ()), text)
+        recipient = self._recipient(message)
+        if recipient is not None and recipient != message.get("sender_id"):
+            self._push_unread(recipient, message["thread_id"])
+
+    # -- connections -------------------------------------------------------
+
+    def connect(self, user_id, websocket):
+        connection = Connection(user_id, websocket)
+        self._connections[user_id].add(connection)
+        counts = self.unread_counts(user_id)
+        connection.push(event("hello", user_id=user_id, unread=counts, total_unread=sum(counts.values())))
+        return connection
+
+    def disconnect(self, connection):
+        if connection.closed:
+            return
+        connection.closed = True
+        sockets = self._connections.get(connection.user_id)
+        if sockets is not None:
+            sockets.discard(connection)
+            if not sockets:
+                del self._connections[connection.user_id]
+        for thread_id in connection.watching:
+            watchers = self._watchers.get(thread_id)
+            if watchers is not None:
+                watchers.discard(connection)
+                if not watchers:
+                    del self._watchers[thread_id]
+
+    def connection_count(self):
+        return sum(len(sockets) for sockets in self._connections.values())
+
+    # -- client actions ----------------------------------------------------
+
+    async def handle(self, connection, frame):
+        kind = frame.get("type")
+        thread_id = frame.get("thread_id")
+        if kind == "ping":
+            connection.push(event("pong"))
+            return
+        if not isinstance(thread_id, int) or not self.is_participant(connection.user_id, thread_id):
+            connection.push(event("error", detail="Unknown thread", request=kind))
+            return
+        if kind == "watch":
+            if len(connection.watching) >= MAX_WATCHED_THREADS:
+                connection.push(event("error", detail="Watching too many threads", request=kind))
+                return
+            connection.watching.add(thread_id)
+            self._watchers[thread_id].add(connection)
+        elif kind == "unwatch":
+            connection.watching.discard(thread_id)
+            self._watchers.get(thread_id, set()).discard(connection)
+        elif kind == "send":
+            try:
+                await self.send_message(connection.user_id, thread_id, frame.get("content"))
+            except OSError:
+                logger.exception("could not store message for thread %s", thread_id)
+                connection.push(event("error", detail="Message could not be sent", request=kind))
+        elif kind == "read":
+            self.mark_read(connection.user_id, thread_id, frame.get("up_to_id"))
+        else:
+            connection.push(event("error", detail="Unknown request type", request=kind))
+
+    async def send_message(self, sender_id, thread_id, content):
+        content = (content or "").strip() if isinstance(content, str) else ""
+        if not content or len(content) > MAX_CONTENT_LENGTH:
+            raise ValueError(f"content must be 1-{MAX_CONTENT_LENGTH} characters")
+        row = {"thread_id": thread_id, "sender_id": sender_id, "content": content}
+        recipient = self._recipient(row)
+        if recipient is not None:
+            row["recipient_id"] = recipient
+        if datasource.is_configured():
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(None, datasource.insert_rows, "messages", [row])
+            message = {key: stored[0].get(key) for key in MESSAGE_COLUMNS.split(",")}
+        else:
+            message = dict(row, id=next(self._local_ids), is_read=False,
+                           created_at=datetime.now(timezone.utc).isoformat())
+            self._local_history[thread_id].append(message)
+        self._record_unread(message)
+        self._fan_out_message(message)
+        return message
+
+    def mark_read(self, user_id, thread_id, up_to_id):
+        if not isinstance(up_to_id, int):
+            return
+        key = (user_id, thread_id)
+        if up_to_id <= self._read_upto.get(key, 0):
+            return
+        self._read_upto[key] = up_to_id
+        ids = self._unread.get(user_id, {}).get(thread_id)
+        if ids:
+            del ids[:bisect.bisect_right(ids, up_to_id)]
+        pending = self._pending_reads.get((thread_id, user_id), 0)
+        self._pending_reads[(thread_id, user_id)] = max(pending, up_to_id)
+        self._push_unread(user_id, thread_id)
+        self._send(self._watchers.get(thread_id, ()), event(
+            "read", thread_id=thread_id, reader_id=user_id, up_to_id=up_to_id))
+
+    async def flush_reads(self):
+        """Persist coalesced read receipts: one UPDATE per (thread, reader) per flush."""
+        if not self._pending_reads or not datasource.is_configured():
+            self._pending_reads.clear()
+            return 0
+        pending, self._pending_reads = self._pending_reads, {}
+        loop = asyncio.get_running_loop()
+        for (thread_id, user_id), up_to_id in pending.items():
+            filters = {"thread_id": f"eq.{thread_id}", "recipient_id": f"eq.{user_id}",
+                       "id": f"lte.{up_to_id}", "is_read": "eq.false"}
+            try:
+                await loop.run_in_executor(None, datasource.update_rows, "messages", filters, {"is_read": True})
+            except Exception:
+                logger.exception("could not persist read receipt for thread %s", thread_id)
+                key = (thread_id, user_id)
+                self._pending_reads[key] = max(self._pending_reads.get(key, 0), up_to_id)
+        return len(pending)
+
+    async def _flush_reads_forever(self):
+        while True:
+            await asyncio.sleep(READ_FLUSH_SECONDS)
+            await self.flush_reads()
+
+    def history(self, thread_id, before=None, limit=50):
+        """One page of a thread, newest first, older than message id ``before``."""
+        if not datasource.is_configured():
+            messages = [m for m in reversed(self._local_history.get(thread_id, ())) if before is None or m["id"] < before]
+            return messages[:limit]
+        filters = {"thread_id": f"eq.{thread_id}"}
+        if before is not None:
+            filters["id"] = f"lt.{before}"
+        return list(datasource.select_rows("messages", MESSAGE_COLUMNS, filters, order="id.desc", limit=limit))
+
+
+hub = MessagingHub()
+router = APIRouter(tags=["messages"])
+
+
+def _user_id(user, fallback=None):
+    return user["id"] if user is not None else fallback
+
+
+@router.get("/api/messages/threads")
+async def list_threads(user=Depends(current_user), user_id: Optional[str] = None):
+    return {"threads": hub.threads_for(_user_id(user, user_id))}
+
+
+@router.get("/api/messages/unread")
+async def unread_counts(user=Depends(current_user), user_id: Optional[str] = None):
+    counts = hub.unread_counts(_user_id(user, user_id))
+    return {"total": sum(counts.values()), "threads": counts}
+
+
+@router.get("/api/messages/threads/{thread_id}/history")
+async def thread_history(
+    thread_id: int,
+    before: Optional[int] = Query(None, ge=1, description="Only messages with a smaller id"),
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(current_user),
+    user_id: Optional[str] = None,
+):
+    if not hub.is_participant(_user_id(user, user_id), thread_id):
+        raise HTTPException(status_code=404, detail="Thread not found")
+    loop = asyncio.get_running_loop()
+    messages = await loop.run_in_executor(None, hub.history, thread_id, before, limit)
+    return {
+        "messages": messages,
+        "next_before": messages[-1]["id"] if len(messages) == limit else None,
+    }
+
+
+@router.websocket("/ws/messages")
+async def messages_socket(websocket: WebSocket, access_token: Optional[str] = None, user_id: Optional[str] = None):
+    # Browsers cannot set headers on a WebSocket, so the session comes as ?access_token=.
+    # user_id is only honoured when Supabase is not configured (local development and load tests).
+    if datasource.is_configured():
+        try:
+            user = await asyncio.get_running_loop().run_in_executor(None, resolve_token, access_token or "")
+        except HTTPException:
+            await websocket.close(code=4401)
+            return
+        user_id = user["id"]
+    elif not user_id:
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    connection = hub.connect(user_id, websocket)
+    writer = asyncio.create_task(connection.drain())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                frame = json.loads(text)
+                if not isinstance(frame, dict):
+                    raise ValueError("expected a JSON object")
+                await hub.handle(connection, frame)
+            except ValueError as exc:
+                connection.push(event("error", detail=str(exc)))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(connection)
+        writer.cancel()
@@ -0,0 +1,375 @@
+"""Request timing, ``/metrics`` in Prometheus text format, and a sampling profiler.
+
+``MetricsMiddleware`` is plain ASGI. It records, per method and route
+template (``/api/images/{digest}``, not the concrete path):
+
+- request count by status
+- a latency histogram, from which p50/p95/p99 are estimated
+- response body sizes
+
+It also tracks in-flight HTTP requests and open WebSockets. A background
+task measures event-loop lag: how late a short sleep wakes up, which is
+what every request pays when a handler blocks the loop.
+
+The sampling profiler is off by default. It can be switched on at runtime
+with ``POST /metrics/profiler`` (only when ``METRICS_TOKEN`` is set), or at
+startup with ``METRICS_PROFILER=1``. While on, a thread snapshots the
+event-loop thread's stack every few milliseconds.
+``GET /metrics/profiler`` returns the counts as collapsed stacks, which
+flamegraph.pl and speedscope read directly.
+"""
+import asyncio
+import bisect
+import collections
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+PROFILE_ON_START = os.getenv("METRICS_PROFILER") == "1"
+LAG_INTERVAL = 0.25
+QUANTILES = (0.5, 0.95, 0.99)
+# Exposed histogram buckets (seconds / bytes), Prometheus-style
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Finer log-spaced buckets, 10% apart from 50us to ~100s, for quantile estimates
+FINE_BUCKETS = tuple(0.00005 * 1.1 ** step for step in range(153))
+MAX_PROFILE_STACKS = 20000
+# getrusage reports ru_maxrss in KiB on Linux but in bytes on macOS
+MAXRSS_SCALE = 1 if sys.platform == "darwin" else 1024
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for position, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[position - 1] if position else 0.0
+                upper = self.bounds[position] if position < len(self.bounds) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+    def exposition(self, name, labels):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_labels(labels, le=le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {self.total!r}")
+        lines.append(f"{name}_count{_labels(labels)} {self.count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class RouteStats:
+    __slots__ = ("latency", "fine", "sizes", "statuses")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.fine = Histogram(FINE_BUCKETS)
+        self.sizes = Histogram(SIZE_BUCKETS)
+        self.statuses = collections.Counter()
+
+
+class Registry:
+    def __init__(self):
+        self.routes = collections.defaultdict(RouteStats)   # (method, route) -> stats
+        self.in_flight = 0
+        self.websockets = 0
+        self.lag = Histogram(LAG_BUCKETS)
+        self.lag_fine = Histogram(FINE_BUCKETS)
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self.started = time.time()
+
+    def observe(self, method, route, status, seconds, size):
+        stats = self.routes[(method, route)]
+        stats.latency.observe(seconds)
+        stats.fine.observe(seconds)
+        stats.sizes.observe(size)
+        stats.statuses[status] += 1
+
+    def observe_lag(self, seconds):
+        self.lag.observe(seconds)
+        self.lag_fine.observe(seconds)
+        self.lag_last = seconds
+        self.lag_max = max(self.lag_max, seconds)
+
+    def summary(self):
+        """Per-route quantiles in milliseconds, for load-test reports."""
+        result = {}
+        for (method, route), stats in sorted(self.routes.items()):
+            result[f"{method} {route}"] = {
+                "count": stats.latency.count,
+                **{f"p{round(q * 100)}_ms": round(stats.fine.quantile(q) * 1000, 3) for q in QUANTILES},
+                "mean_bytes": round(stats.sizes.total / stats.sizes.count) if stats.sizes.count else 0,
+                "statuses": {str(status): count for status, count in sorted(stats.statuses.items())},
+            }
+        return result
+
+    def render(self):
+        lines = [
+            "# HELP mmhub_http_requests_total HTTP requests by route and status.",
+            "# TYPE mmhub_http_requests_total counter",
+        ]
+        routes = sorted(self.routes.items())
+        for (method, route), stats in routes:
+            for status, count in sorted(stats.statuses.items()):
+                labels = _labels([("method", method), ("route", route), ("status", status)])
+                lines.append(f"mmhub_http_requests_total{labels} {count}")
+        lines += ["# HELP mmhub_http_request_duration_seconds Time from request start to last body byte.",
+                  "# TYPE mmhub_http_request_duration_seconds histogram"]
+        for (method, route), stats in routes:
+            lines += stats.latency.exposition("mmhub_http_request_duration_seconds",
+                                              [("method", method), ("route", route)])
+        lines += ["# HELP mmhub_http_request_duration_quantile_seconds Latency quantiles since start, "
+                  "estimated from 10%-wide buckets.",
+                  "# TYPE mmhub_http_request_duration_quantile_seconds gauge"]
+        for (method, route), stats in routes:
+            for q in QUANTILES:
+                lines.append(f"mmhub_http_request_duration_quantile_seconds"
+                             f"{_labels([('method', method), ('route', route), ('quantile', q)])} "
+                             f"{stats.fine.quantile(q)!r}")
+        lines += ["# HELP mmhub_http_response_size_bytes Response body size.",
+                  "# TYPE mmhub_http_response_size_bytes histogram"]
+        for (method, route), stats in routes:
+            lines += stats.sizes.exposition("mmhub_http_response_size_bytes", [("method", method), ("route", route)])
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        lines += [
+            "# HELP mmhub_http_requests_in_flight HTTP requests currently being handled.",
+            "# TYPE mmhub_http_requests_in_flight gauge",
+            f"mmhub_http_requests_in_flight {self.in_flight}",
+            "# HELP mmhub_websocket_connections Open WebSocket connections.",
+            "# TYPE mmhub_websocket_connections gauge",
+            f"mmhub_websocket_connections {self.websockets}",
+            "# HELP mmhub_event_loop_lag_seconds How late a short sleep on the event loop woke up.",
+            "# TYPE mmhub_event_loop_lag_seconds histogram",
+            *self.lag.exposition("mmhub_event_loop_lag_seconds", []),
+            "# HELP mmhub_event_loop_lag_max_seconds Worst event-loop lag since start.",
+            "# TYPE mmhub_event_loop_lag_max_seconds gauge",
+            f"mmhub_event_loop_lag_max_seconds {self.lag_max!r}",
+            "# HELP process_cpu_seconds_total User and system CPU time.",
+            "# TYPE process_cpu_seconds_total counter",
+            f"process_cpu_seconds_total {usage.ru_utime + usage.ru_stime!r}",
+            "# HELP process_max_resident_memory_bytes Peak resident set size.",
+            "# TYPE process_max_resident_memory_bytes gauge",
+            f"process_max_resident_memory_bytes {usage.ru_maxrss * MAXRSS_SCALE}",
+            "# HELP process_start_time_seconds Start time since the epoch.",
+            "# TYPE process_start_time_seconds gauge",
+            f"process_start_time_seconds {self.started!r}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts open WebSockets; labels come from the matched route."""
+
+    def __init__(self, app, registry=registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            self.registry.websockets += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.registry.websockets -= 1
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.in_flight -= 1
+            route = scope.get("route")
+            self.registry.observe(scope["method"], getattr(route, "path", "<unmatched>"), status,
+                                  time.perf_counter() - started, size)
+
+
+async def monitor_event_loop(registry=registry, interval=LAG_INTERVAL):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        registry.observe_lag(max(0.0, time.perf_counter() - expected))
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack on a timer and counts collapsed stacks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.target = None
+        self.interval = 0.005
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.005, target=None):
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = interval
+            self.target = target if target is not None else threading.main_thread().ident
+            self.stacks.clear()
+            self.samples = 0
+            self.started = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return False
+            self._stop.set()
+            thread = self._thread
+        thread.join()
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack = ";".join(reversed(names))
+            with self._lock:
+                if stack in self.stacks or len(self.stacks) < MAX_PROFILE_STACKS:
+                    self.stacks[stack] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def status(self):
+        return {"running": self.running, "interval_ms": round(self.interval * 1000, 3),
+                "samples": self.samples, "stacks": len(self.stacks), "started": self.started}
+
+
+profiler = SamplingProfiler()
+
+
+def start():
+    """Start the lag monitor (and the profiler if ``METRICS_PROFILER=1``); call on the event loop."""
+    if PROFILE_ON_START:
+        profiler.start(target=threading.get_ident())
+    return asyncio.create_task(monitor_event_loop())
+
+
+router = APIRouter(tags=["metrics"])
+
+
+def require_metrics_token(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Metrics token required")
+
+
+def require_profiler_token(authorization: Optional[str] = Header(None)):
+    # Starting a sampler is a write; without a configured token nobody may do it remotely.
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=403, detail="Set METRICS_TOKEN to control the profiler")
+    require_metrics_token(authorization)
+
+
+class ProfilerSettings(BaseModel):
+    enabled: bool
+    interval_ms: float = Field(5.0, ge=1.0, le=1000.0)
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+async def prometheus_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/summary", dependencies=[Depends(require_metrics_token)])
+async def metrics_summary():
+    lag_p99 = min(registry.lag_fine.quantile(0.99) or 0.0, registry.lag_max)
+    return {
+        "routes": registry.summary(),
+        "in_flight": registry.in_flight,
+        "websockets": registry.websockets,
+        "event_loop_lag_ms": {"last": round(registry.lag_last * 1000, 3), "max": round(registry.lag_max * 1000, 3),
+                              "p99": round(lag_p99 * 1000, 3)},
+    }
+
+
+@router.get("/metrics/profiler", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_token)])
+async def profiler_stacks():
+    """Collapsed stacks from the current or last profiling run."""
+    return profiler.collapsed()
+
+
+@router.post("/metrics/profiler", dependencies=[Depends(require_profiler_token)])
+async def toggle_profiler(settings: ProfilerSettings):
+    if settings.enabled:
+        # Sample the thread running this handler: the event loop's.
+        profiler.start(settings.interval_ms / 1000, target=threading.get_ident())
+    else:
+        await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return profiler.status()
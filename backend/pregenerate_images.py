@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Ingest the existing listing catalogue and render its image variants ahead of traffic.
+
+Every URL in ``properties.images`` is downloaded once, stored under its
+content hash (and recorded for ``/api/images/resolve``), then each width
+bucket and format is rendered in the image process pool. Variants already
+in the cache are skipped, so the command can be re-run after new listings
+arrive.
+
+Usage (from backend/):
+    python pregenerate_images.py
+    python pregenerate_images.py --widths 320,640,960 --formats webp
+    python pregenerate_images.py --dir ~/photos      # local files instead of Supabase
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import datasource
+import images
+
+
+def catalogue_urls(limit=None):
+    urls = []
+    for row in datasource.select_rows("properties", "id,images"):
+        listing_images = row.get("images") or []
+        if isinstance(listing_images, str):
+            listing_images = json.loads(listing_images)
+        urls.extend(url for url in listing_images if isinstance(url, str) and url.startswith("http"))
+    urls = list(dict.fromkeys(urls))
+    return urls[:limit] if limit else urls
+
+
+def local_files(directory, limit=None):
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(directory) for name in names)
+    return paths[:limit] if limit else paths
+
+
+def ingest(source):
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source, timeout=30) as response:
+            data = response.read(images.MAX_UPLOAD_BYTES + 1)
+    else:
+        with open(source, "rb") as local:
+            data = local.read()
+    digest, _, _ = images.store.ingest(data)
+    if source.startswith(("http://", "https://")):
+        images.store.remember_source(source, digest)
+    return digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate listing image variants")
+    parser.add_argument("--dir", help="Ingest image files from this directory instead of Supabase")
+    parser.add_argument("--widths", default=",".join(map(str, images.WIDTHS)))
+    parser.add_argument("--formats", default=",".join(images.FORMATS))
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: one per core)")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N images")
+    args = parser.parse_args()
+
+    widths = [int(width) for width in args.widths.split(",")]
+    formats = [fmt for fmt in args.formats.split(",") if fmt]
+    unknown = set(formats) - set(images.FORMATS)
+    if unknown:
+        sys.exit(f"unknown formats: {', '.join(sorted(unknown))}")
+    if args.dir:
+        sources = local_files(args.dir, args.limit)
+    elif datasource.is_configured():
+        sources = catalogue_urls(args.limit)
+    else:
+        sys.exit("SUPABASE_URL is not configured; pass --dir to ingest local files")
+    if args.workers:
+        images.store.workers = args.workers
+
+    started = time.perf_counter()
+    digests, failed = [], 0
+    with ThreadPoolExecutor(max_workers=args.download_workers) as downloads:
+        futures = {downloads.submit(ingest, source): source for source in sources}
+        for future in as_completed(futures):
+            try:
+                digests.append(future.result())
+            except (OSError, ValueError) as exc:
+                failed += 1
+                print(f"skipped {futures[future]}: {exc}", file=sys.stderr)
+    ingested_s = time.perf_counter() - started
+    print(f"ingested {len(digests):,} originals ({failed} failed) in {ingested_s:.1f}s")
+
+    jobs = {}
+    for digest in set(digests):
+        for fmt in formats:
+            for width in widths:
+                width, path = images.store.plan(digest, width, fmt)
+                if path not in jobs and images.store.cache.get(path) is None:
+                    jobs[path] = (images.store.original_path(digest), path, width, fmt)
+    started = time.perf_counter()
+    rendered = 0
+    futures = {images.store.pool.submit(images.render_variant, *job): path for path, job in jobs.items()}
+    for future in as_completed(futures):
+        try:
+            images.store.cache.add(futures[future], future.result())
+            rendered += 1
+        except Exception as exc:
+            print(f"could not render {futures[future]}: {exc}", file=sys.stderr)
+    images.store.shutdown()
+    elapsed = time.perf_counter() - started
+    print(f"rendered {rendered:,} variants in {elapsed:.1f}s "
+          f"({rendered / elapsed if elapsed else 0:,.1f}/s on {images.store.workers} workers); "
+          f"cache holds {images.store.cache.total_bytes / 1024 ** 2:,.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""In-memory columnar index over the ``properties`` table.
+
+Backs ``/api/properties/search`` so the Listings page no longer downloads the
+whole table and filters it in the browser. Scalar filters run as vectorised
+comparisons over NumPy columns, amenities are one packed bitmap per amenity,
+and location/title words go through an inverted token index.
+"""
+import base64
+import bisect
+import json
+import re
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from fastapi import APIRouter, HTTPException, Query
+
+from datasource import parse_timestamp
+
+PROPERTY_TYPES = ("apartment", "studio", "house", "condo", "villa")
+SORTS = {
+    "newest": ("created_at", True),
+    "oldest": ("created_at", False),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+}
+MAX_PREFIX_EXPANSION = 256
+BEDROOM_FACET_CAP = 5
+INT16_MAX = 32767
+
+# Same suffixes Listings.tsx strips so "Sukhumvit, Bangkok" does not match
+# every listing in Bangkok.
+_CITY_SUFFIX = re.compile(r",?\s*(bangkok|chiang mai|phuket)$")
+_TOKEN_SPLIT = re.compile(r"[^\w\u0E00-\u0E7F]+")
+
+
+class InvalidQuery(ValueError):
+    """A sort or cursor the client sent that cannot be used; reported as 400."""
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_SPLIT.split((text or "").lower()) if token]
+
+
+def _bit(slot):
+    return np.uint8(0x80 >> (slot & 7))
+
+
+def _amenity_key(name):
+    return str(name).strip().lower()
+
+
+class PropertyIndex:
+    """Columnar mirror of ``properties``; rows live at stable slot positions."""
+
+    def __init__(self, capacity=1024):
+        self._lock = threading.RLock()
+        self._capacity = 0
+        self._size = 0
+        self._slots = {}          # property id -> slot
+        self._rows = []           # slot -> original row dict (None once removed)
+        self._row_tokens = []     # slot -> tokens indexed for that slot
+        self._row_amenities = []  # slot -> amenity keys set for that slot
+        self._postings = {}       # token -> set of slots
+        self._posting_arrays = {}
+        self._vocabulary = []
+        self._vocabulary_dirty = False
+        self._amenity_slots = {}  # amenity key -> bitmap row
+        self._amenity_labels = []
+        self._amenity_bits = np.zeros((0, 0), dtype=np.uint8)  # packed, one row per amenity
+        self._grow(capacity)
+
+    def __len__(self):
+        return len(self._slots)
+
+    # -- maintenance -------------------------------------------------------
+
+    def _grow(self, capacity):
+        def resized(name, dtype):
+            column = np.zeros(capacity, dtype=dtype)
+            if self._capacity:
+                column[:self._capacity] = getattr(self, name)
+            setattr(self, name, column)
+
+        resized("ids", np.int64)
+        resized("price", np.float64)
+        resized("bedrooms", np.int16)
+        resized("bathrooms", np.int16)
+        resized("type_code", np.int8)
+        resized("available", bool)
+        resized("created_at", np.float64)
+        resized("live", bool)
+        bits = np.zeros((self._amenity_bits.shape[0], capacity // 8), dtype=np.uint8)
+        bits[:, :self._capacity // 8] = self._amenity_bits
+        self._amenity_bits = bits
+        self._capacity = capacity
+
+    def _amenity_row(self, key, label):
+        row = self._amenity_slots.get(key)
+        if row is None:
+            row = len(self._amenity_labels)
+            self._amenity_slots[key] = row
+            self._amenity_labels.append(label)
+            self._amenity_bits = np.vstack([self._amenity_bits, np.zeros((1, self._capacity // 8), dtype=np.uint8)])
+        return row
+
+    def _unindex_slot(self, slot):
+        for token in self._row_tokens[slot]:
+            postings = self._postings[token]
+            postings.discard(slot)
+            self._posting_arrays.pop(token, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+        for key in self._row_amenities[slot]:
+            self._amenity_bits[self._amenity_slots[key], slot >> 3] &= ~_bit(slot)
+
+    def upsert(self, row):
+        with self._lock:
+            property_id = int(row["id"])
+            slot = self._slots.get(property_id)
+            if slot is None:
+                if self._size == self._capacity:
+                    self._grow(self._capacity * 2)
+                slot = self._size
+                self._size += 1
+                self._slots[property_id] = slot
+                self._rows.append(None)
+                self._row_tokens.append(())
+                self._row_amenities.append(())
+            else:
+                self._unindex_slot(slot)
+
+            property_type = (row.get("property_type") or "").lower()
+            self._rows[slot] = row
+            self.ids[slot] = property_id
+            self.price[slot] = float(row.get("price") or 0)
+            # int16 columns, and the facet bincount needs non-negative counts
+            self.bedrooms[slot] = min(max(int(row.get("bedrooms") or 0), 0), INT16_MAX)
+            self.bathrooms[slot] = min(max(int(row.get("bathrooms") or 0), 0), INT16_MAX)
+            self.type_code[slot] = PROPERTY_TYPES.index(property_type) if property_type in PROPERTY_TYPES else -1
+            self.available[slot] = row.get("is_available") is not False
+            self.created_at[slot] = parse_timestamp(row.get("created_at"))
+            self.live[slot] = True
+
+            tokens = set(tokenize(row.get("location"))) | set(tokenize(row.get("title")))
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    self._vocabulary_dirty = True
+                postings.add(slot)
+                self._posting_arrays.pop(token, None)
+            self._row_tokens[slot] = tuple(tokens)
+
+            amenities = {}
+            for label in row.get("amenities") or ():
+                amenities.setdefault(_amenity_key(label), str(label).strip())
+            for key, label in amenities.items():
+                row_index = self._amenity_row(key, label)
+                self._amenity_bits[row_index, slot >> 3] |= _bit(slot)
+            self._row_amenities[slot] = tuple(amenities)
+
+    def remove(self, property_id):
+        """Tombstone a listing; its slot is reclaimed on the next full rebuild."""
+        with self._lock:
+            slot = self._slots.pop(int(property_id), None)
+            if slot is None:
+                return
+            self._unindex_slot(slot)
+            self._rows[slot] = None
+            self._row_tokens[slot] = ()
+            self._row_amenities[slot] = ()
+            self.live[slot] = False
+
+    def apply(self, rows, reset=False):
+        """``TableFeed`` listener: upsert changed rows, or rebuild from a full snapshot."""
+        if reset:
+            fresh = PropertyIndex(capacity=max(1024, -(-len(rows) // 8) * 8))
+            for row in rows:
+                fresh.upsert(row)
+            state = vars(fresh)
+            state.pop("_lock")
+            with self._lock:
+                vars(self).update(state)
+            return
+        for row in rows:
+            self.upsert(row)
+
+    # -- querying ----------------------------------------------------------
+
+    def _slots_for_token(self, token):
+        array = self._posting_arrays.get(token)
+        if array is None:
+            array = np.fromiter(self._postings[token], dtype=np.int64, count=len(self._postings[token]))
+            self._posting_arrays[token] = array
+        return array
+
+    def _location_mask(self, text):
+        """Mirror the Listings page: a listing matches if any query word prefixes one of its tokens."""
+        term = text.lower().strip()
+        words = tokenize(_CITY_SUFFIX.sub("", term)) or tokenize(term)
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        mask = np.zeros(self._size, dtype=bool)
+        for word in words:
+            start = bisect.bisect_left(self._vocabulary, word)
+            for token in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+                if not token.startswith(word):
+                    break
+                mask[self._slots_for_token(token)] = True
+        return mask
+
+    def _filter_mask(self, location, min_price, max_price, bedrooms, property_type, amenities, available):
+        n = self._size
+        mask = self.live[:n].copy()
+        if location and location.strip():
+            mask &= self._location_mask(location)
+        if min_price is not None:
+            mask &= self.price[:n] >= min_price
+        if max_price is not None:
+            mask &= self.price[:n] <= max_price
+        if bedrooms is not None:
+            mask &= self.bedrooms[:n] >= bedrooms
+        if property_type:
+            kind = property_type.lower()
+            if kind not in PROPERTY_TYPES:
+                return np.zeros(n, dtype=bool)
+            mask &= self.type_code[:n] == PROPERTY_TYPES.index(kind)
+        for name in amenities or ():
+            row = self._amenity_slots.get(_amenity_key(name))
+            if row is None:
+                return np.zeros(n, dtype=bool)
+            mask &= np.unpackbits(self._amenity_bits[row], count=n).view(bool)
+        if available is not None:
+            mask &= self.available[:n] == available
+        return mask
+
+    def _facets(self, mask):
+        n = self._size
+        type_counts = np.bincount(self.type_code[:n][mask & (self.type_code[:n] >= 0)], minlength=len(PROPERTY_TYPES))
+        bedroom_counts = np.bincount(np.minimum(self.bedrooms[:n][mask], BEDROOM_FACET_CAP), minlength=BEDROOM_FACET_CAP + 1)
+        packed = np.packbits(mask)
+        amenity_counts = np.bitwise_count(self._amenity_bits[:, :packed.size] & packed).sum(axis=1)
+        prices = self.price[:n][mask]
+        return {
+            "property_type": {kind: int(count) for kind, count in zip(PROPERTY_TYPES, type_counts)},
+            "bedrooms": {(f"{b}+" if b == BEDROOM_FACET_CAP else str(b)): int(c) for b, c in enumerate(bedroom_counts)},
+            "amenities": {
+                label: int(count)
+                for label, count in zip(self._amenity_labels, amenity_counts) if count
+            },
+            "price": {
+                "min": float(prices.min()) if prices.size else None,
+                "max": float(prices.max()) if prices.size else None,
+            },
+        }
+
+    def _page(self, mask, sort, cursor, limit):
+        column, descending = SORTS[sort]
+        slots = np.flatnonzero(mask)
+        keys = getattr(self, column)[slots]
+        ids = self.ids[slots]
+        if descending:
+            keys = -keys
+            ids = -ids
+        if cursor is not None:
+            after_key, after_id = cursor
+            if descending:
+                after_key, after_id = -after_key, -after_id
+            keep = (keys > after_key) | ((keys == after_key) & (ids > after_id))
+            slots, keys, ids = slots[keep], keys[keep], ids[keep]
+        remaining = slots.size
+
+        # Select the first `limit` by key in O(m), keep ties at the boundary,
+        # then fully order only that small candidate set by (key, id).
+        if slots.size > limit:
+            threshold = np.partition(keys, limit - 1)[limit - 1]
+            keep = keys <= threshold
+            slots, keys, ids = slots[keep], keys[keep], ids[keep]
+        order = np.lexsort((ids, keys))[:limit]
+        page = slots[order]
+
+        next_cursor = None
+        if remaining > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(sort, float(getattr(self, column)[last]), int(self.ids[last]))
+        return page, next_cursor
+
+    def search(self, location=None, min_price=None, max_price=None, bedrooms=None,
+               property_type=None, amenities=None, available=None,
+               sort="newest", cursor=None, limit=24, facets=True):
+        if sort not in SORTS:
+            raise InvalidQuery(f"unknown sort '{sort}'")
+        after = decode_cursor(cursor, sort) if cursor else None
+        started = time.perf_counter()
+        with self._lock:
+            mask = self._filter_mask(location, min_price, max_price, bedrooms, property_type, amenities, available)
+            total = int(np.count_nonzero(mask))
+            page, next_cursor = self._page(mask, sort, after, limit)
+            items = [self._rows[slot] for slot in page]
+            result = {
+                "items": items,
+                "total": total,
+                "next_cursor": next_cursor,
+            }
+            if facets:
+                result["facets"] = self._facets(mask)
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+
+def encode_cursor(sort, key, property_id):
+    payload = json.dumps([sort, key, property_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, key, property_id = json.loads(base64.urlsafe_b64decode(padded))
+        key, property_id = float(key), int(property_id)
+    except (ValueError, TypeError):
+        raise InvalidQuery("malformed cursor")
+    if cursor_sort != sort:
+        raise InvalidQuery("cursor was issued for a different sort order")
+    return key, property_id
+
+
+index = PropertyIndex()
+router = APIRouter(prefix="/api/properties", tags=["properties"])
+
+
+@router.get("/search")
+async def search_properties(
+    location: Optional[str] = Query(None, description="Free-text location or title words"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    bedrooms: Optional[int] = Query(None, ge=0, description="Minimum number of bedrooms"),
+    property_type: Optional[str] = None,
+    amenities: List[str] = Query([], description="All listed amenities must be present"),
+    available: Optional[bool] = None,
+    sort: str = "newest",
+    cursor: Optional[str] = None,
+    limit: int = Query(24, ge=1, le=100),
+    facets: bool = True,
+):
+    try:
+        return index.search(
+            location=location, min_price=min_price, max_price=max_price, bedrooms=bedrooms,
+            property_type=property_type, amenities=amenities, available=available,
+            sort=sort, cursor=cursor, limit=limit, facets=facets,
+        )
+    except InvalidQuery as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
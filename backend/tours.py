@@ -0,0 +1,452 @@
+"""Tour scheduling: free slots, conflict checks and batched notifications.
+
+``tour_requests`` only had a ``requested_date`` index, and nothing stopped
+two tours of one property, or two tours one owner has to attend, from
+overlapping. Every owner or admin view re-scanned the table to find
+clashes. Here pending and confirmed tours are kept in interval indexes
+keyed by property and by owner. Each key's intervals are sorted by start,
+so an overlap check is a bisect to the first candidate plus the handful of
+intervals it actually overlaps.
+
+Status changes, whether made through this API or directly in Supabase and
+seen by the feed, queue ``tour_notifications`` rows. The queue is
+deduplicated and flushed as one bulk insert every couple of seconds.
+"""
+import asyncio
+import bisect
+import itertools
+import logging
+import threading
+import urllib.error
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+from zoneinfo import ZoneInfo
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+
+import datasource
+from admin_summary import summary
+from auth import current_user
+
+logger = logging.getLogger("mmhub.tours")
+
+TOUR_MINUTES = 30
+DAY_START = 9 * 60            # first slot 09:00, as offered by TourScheduling.tsx
+DAY_END = 18 * 60             # last slot 18:00
+ACTIVE_STATUSES = ("pending", "confirmed")
+MAX_AVAILABILITY_DAYS = 62
+NOTIFY_FLUSH_SECONDS = 2.0
+NOTIFY_BATCH = 500
+SENT_KEYS_KEPT = 20000        # recently inserted notification keys remembered for dedup
+TIMEZONE = ZoneInfo("Asia/Bangkok")
+EPOCH = date(2000, 1, 1)
+STATUS_NOTIFICATIONS = {
+    # new status: (notification_type, message template)
+    "confirmed": ("tour_confirmed", 'Your tour request for "{title}" has been confirmed'),
+    "cancelled": ("tour_cancelled", 'Your tour request for "{title}" has been cancelled'),
+    "rejected": ("tour_cancelled", 'Your tour request for "{title}" has been declined'),
+    "completed": ("tour_completed", 'Your tour for "{title}" has been completed'),
+}
+
+
+def to_minutes(day, time_text):
+    """Minutes since 2000-01-01 for a ``requested_date`` and ``requested_time`` (``HH:MM[:SS]``)."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    hours, minutes = str(time_text)[:5].split(":")
+    return (day - EPOCH).days * 1440 + int(hours) * 60 + int(minutes)
+
+
+def from_minutes(value):
+    day, minute = divmod(value, 1440)
+    return EPOCH + timedelta(days=day), f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def now_minutes():
+    now = datetime.now(TIMEZONE)
+    return to_minutes(now.date(), now.strftime("%H:%M"))
+
+
+class IntervalIndex:
+    """Per-key intervals sorted by start; overlap queries are a bisect plus the hits."""
+
+    def __init__(self):
+        self._starts = defaultdict(list)   # key -> sorted start minutes
+        self._items = defaultdict(list)    # key -> (start, end, tour id), same order
+        self._longest = defaultdict(int)   # key -> longest interval, bounds how early an overlap can start
+
+    def add(self, key, start, end, tour_id):
+        position = bisect.bisect_right(self._starts[key], start)
+        self._starts[key].insert(position, start)
+        self._items[key].insert(position, (start, end, tour_id))
+        self._longest[key] = max(self._longest[key], end - start)
+
+    def remove(self, key, start, tour_id):
+        starts = self._starts.get(key)
+        if not starts:
+            return
+        position = bisect.bisect_left(starts, start)
+        while position < len(starts) and starts[position] == start:
+            if self._items[key][position][2] == tour_id:
+                del starts[position], self._items[key][position]
+                break
+            position += 1
+        if not starts:
+            del self._starts[key], self._items[key], self._longest[key]
+
+    def overlapping(self, key, start, end):
+        """(start, end, tour id) of intervals under ``key`` that overlap ``[start, end)``."""
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        low = bisect.bisect_right(starts, start - self._longest[key])
+        high = bisect.bisect_left(starts, end)
+        return [item for item in self._items[key][low:high] if item[1] > start]
+
+    def __len__(self):
+        return sum(len(starts) for starts in self._starts.values())
+
+
+class TourSchedule:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.by_property = IntervalIndex()
+        self.by_owner = IntervalIndex()
+        self._tours = {}        # tour id -> {property_id, owner_id, requester_id, start, status}
+        self._properties = {}   # property id -> (owner id, title)
+        self._pending = OrderedDict()   # dedup key -> notification row
+        self._sent = OrderedDict()      # dedup keys already inserted, oldest first
+        self._provisional_ids = itertools.count(-1, -1)
+        self._local_ids = itertools.count(1)
+
+    # -- feed listeners ----------------------------------------------------
+
+    def apply_properties(self, rows, reset=False):
+        properties = {row["id"]: (row.get("owner_id"), row.get("title") or "your property") for row in rows}
+        with self._lock:
+            if reset:
+                self._properties = properties
+            else:
+                self._properties.update(properties)
+
+    def apply(self, rows, reset=False):
+        """``tour_requests`` listener; status changes against known state queue notifications."""
+        if reset:
+            self._apply_snapshot(rows)
+            return
+        with self._lock:
+            for row in rows:
+                old = self._tours.get(row["id"])
+                tour = self._store(row)
+                if old is not None and old["status"] != tour["status"]:
+                    self._notify_status(row["id"], tour)
+
+    def _apply_snapshot(self, rows):
+        # Index the snapshot off-lock and swap it in, so availability checks and
+        # bookings are not held up for the whole rebuild.
+        fresh = TourSchedule()
+        for row in rows:
+            fresh._store(row)
+        with self._lock:
+            for tour_id, tour in fresh._tours.items():
+                old = self._tours.get(tour_id)
+                if old is not None and old["status"] != tour["status"]:
+                    self._notify_status(tour_id, tour)
+            for tour_id, tour in self._tours.items():
+                if tour_id < 0:   # reservation whose insert is still in flight
+                    fresh._index(tour_id, tour)
+            self._tours, self.by_property, self.by_owner = fresh._tours, fresh.by_property, fresh.by_owner
+
+    def _store(self, row):
+        tour = {
+            "property_id": row.get("property_id"),
+            "owner_id": row.get("owner_id"),
+            "requester_id": row.get("requester_id"),
+            "start": to_minutes(row["requested_date"], row["requested_time"]),
+            "status": row.get("status") or "pending",
+        }
+        self._drop(row["id"])
+        self._index(row["id"], tour)
+        return tour
+
+    def _index(self, tour_id, tour):
+        self._tours[tour_id] = tour
+        if tour["status"] in ACTIVE_STATUSES:
+            end = tour["start"] + TOUR_MINUTES
+            self.by_property.add(tour["property_id"], tour["start"], end, tour_id)
+            if tour["owner_id"]:
+                self.by_owner.add(tour["owner_id"], tour["start"], end, tour_id)
+
+    def _drop(self, tour_id):
+        tour = self._tours.pop(tour_id, None)
+        if tour is not None and tour["status"] in ACTIVE_STATUSES:
+            self.by_property.remove(tour["property_id"], tour["start"], tour_id)
+            if tour["owner_id"]:
+                self.by_owner.remove(tour["owner_id"], tour["start"], tour_id)
+
+    # -- queries -----------------------------------------------------------
+
+    def property_info(self, property_id):
+        """(owner id, title) of a mirrored property; owner is None when unknown."""
+        with self._lock:
+            return self._properties.get(property_id, (None, "your property"))
+
+    def tour(self, tour_id):
+        with self._lock:
+            tour = self._tours.get(tour_id)
+            return dict(tour) if tour is not None else None
+
+    def conflicts(self, property_id, owner_id, start, ignore=None, statuses=ACTIVE_STATUSES):
+        """Ids of tours in ``statuses`` at the property, or attended by the owner, overlapping a new tour."""
+        end = start + TOUR_MINUTES
+        with self._lock:
+            hits = self.by_property.overlapping(property_id, start, end)
+            if owner_id:
+                hits += self.by_owner.overlapping(owner_id, start, end)
+            return sorted({tour_id for _, _, tour_id in hits
+                           if tour_id != ignore and self._tours[tour_id]["status"] in statuses})
+
+    def availability(self, property_id, first_day, last_day, after=None):
+        """Free slot start times per day, skipping slots that start before ``after`` (minutes)."""
+        after = now_minutes() if after is None else after
+        owner_id = self.property_info(property_id)[0]
+        days = []
+        with self._lock:
+            day = first_day
+            while day <= last_day:
+                base = (day - EPOCH).days * 1440
+                window_start, window_end = base + DAY_START, base + DAY_END + TOUR_MINUTES
+                busy = self.by_property.overlapping(property_id, window_start, window_end)
+                if owner_id:
+                    busy += self.by_owner.overlapping(owner_id, window_start, window_end)
+                slots = []
+                for start in range(window_start, base + DAY_END + 1, TOUR_MINUTES):
+                    if start <= after:
+                        continue
+                    end = start + TOUR_MINUTES
+                    if not any(b_start < end and b_end > start for b_start, b_end, _ in busy):
+                        slots.append(from_minutes(start)[1])
+                days.append({"date": day.isoformat(), "slots": slots})
+                day += timedelta(days=1)
+        return days
+
+    def next_free(self, property_id, start, count=5):
+        """The next ``count`` free slots from ``start`` onwards, within a fortnight."""
+        first_day = from_minutes(start)[0]
+        found = []
+        for entry in self.availability(property_id, first_day, first_day + timedelta(days=14), after=start - 1):
+            found.extend(f"{entry['date']}T{slot}" for slot in entry["slots"])
+            if len(found) >= count:
+                break
+        return found[:count]
+
+    # -- writes ------------------------------------------------------------
+
+    def reserve(self, row):
+        """Index a new tour under a provisional id if it conflicts with nothing; returns the id or None."""
+        with self._lock:
+            start = to_minutes(row["requested_date"], row["requested_time"])
+            if self.conflicts(row["property_id"], row.get("owner_id"), start):
+                return None
+            provisional = next(self._provisional_ids)
+            self._store(dict(row, id=provisional, status="pending"))
+            return provisional
+
+    def confirm_reservation(self, provisional, row):
+        with self._lock:
+            self._drop(provisional)
+            self._store(row)
+
+    def release(self, provisional):
+        with self._lock:
+            self._drop(provisional)
+
+    def set_status(self, tour_id, status):
+        with self._lock:
+            tour = self._tours.get(tour_id)
+            if tour is None or tour["status"] == status:
+                return
+            row = {"id": tour_id, "requested_date": from_minutes(tour["start"])[0],
+                   "requested_time": from_minutes(tour["start"])[1], **tour, "status": status}
+            self._notify_status(tour_id, self._store(row))
+
+    # -- notifications -----------------------------------------------------
+
+    def queue_notification(self, tour_id, recipient_id, notification_type, message):
+        if not recipient_id or tour_id is None or tour_id < 0:
+            return
+        key = (tour_id, recipient_id, notification_type)
+        with self._lock:
+            if key in self._pending or key in self._sent:
+                return
+            self._pending[key] = {"tour_request_id": tour_id, "recipient_id": recipient_id,
+                                  "message": message, "notification_type": notification_type}
+
+    def _notify_status(self, tour_id, tour):
+        notification = STATUS_NOTIFICATIONS.get(tour["status"])
+        if notification is None:
+            return
+        title = self.property_info(tour["property_id"])[1]
+        self.queue_notification(tour_id, tour["requester_id"], notification[0], notification[1].format(title=title))
+
+    def pending_notifications(self):
+        with self._lock:
+            return len(self._pending)
+
+    async def flush_notifications(self):
+        """Insert queued notifications in bulk; failed batches go back on the queue."""
+        with self._lock:
+            batch, self._pending = self._pending, OrderedDict()
+        if not batch:
+            return 0
+        if not datasource.is_configured():
+            self._mark_sent(batch)
+            return len(batch)
+        keys, rows = list(batch), list(batch.values())
+        loop = asyncio.get_running_loop()
+        inserted = 0
+        for offset in range(0, len(rows), NOTIFY_BATCH):
+            chunk = dict(zip(keys[offset:offset + NOTIFY_BATCH], rows[offset:offset + NOTIFY_BATCH]))
+            try:
+                await loop.run_in_executor(None, datasource.insert_rows, "tour_notifications", list(chunk.values()))
+            except Exception:
+                logger.exception("could not insert %d tour notifications", len(chunk))
+                with self._lock:
+                    chunk.update(self._pending)
+                    self._pending = OrderedDict(chunk)
+                continue
+            self._mark_sent(chunk)
+            inserted += len(chunk)
+        return inserted
+
+    def _mark_sent(self, batch):
+        with self._lock:
+            for key in batch:
+                self._sent[key] = True
+            while len(self._sent) > SENT_KEYS_KEPT:
+                self._sent.popitem(last=False)
+
+    async def _flush_forever(self):
+        while True:
+            await asyncio.sleep(NOTIFY_FLUSH_SECONDS)
+            await self.flush_notifications()
+
+    def start(self):
+        return asyncio.create_task(self._flush_forever())
+
+    def next_local_id(self):
+        return next(self._local_ids)
+
+
+schedule = TourSchedule()
+router = APIRouter(tags=["tours"])
+
+
+class TourRequestIn(BaseModel):
+    property_id: int
+    requested_date: date
+    requested_time: str = Field(..., pattern=r"^\d{2}:\d{2}$")
+    message: Optional[str] = Field(None, max_length=2000)
+    contact_method: Literal["phone", "email", "message"] = "phone"
+    requester_name: str = Field(..., min_length=1, max_length=255)
+    requester_phone: Optional[str] = Field(None, max_length=20)
+    requester_email: str = Field(..., min_length=3, max_length=255)
+
+
+class TourStatusIn(BaseModel):
+    status: Literal["pending", "confirmed", "cancelled", "completed", "rejected"]
+
+
+@router.get("/api/tours/availability")
+async def tour_availability(
+    property_id: int,
+    from_: Optional[date] = Query(None, alias="from", description="First day (default: today)"),
+    to: Optional[date] = Query(None, description="Last day (default: a week after from)"),
+):
+    first_day = from_ or datetime.now(TIMEZONE).date()
+    last_day = to or first_day + timedelta(days=6)
+    if last_day < first_day or (last_day - first_day).days >= MAX_AVAILABILITY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must be 1-{MAX_AVAILABILITY_DAYS} days")
+    return {
+        "property_id": property_id,
+        "slot_minutes": TOUR_MINUTES,
+        "days": schedule.availability(property_id, first_day, last_day),
+    }
+
+
+def _slot_taken(property_id, start):
+    """409 for a clashing tour, with the next free slots from ``start``."""
+    return HTTPException(status_code=409, detail={
+        "message": "That time is already taken",
+        "alternatives": schedule.next_free(property_id, start),
+    })
+
+
+@router.post("/api/tours", status_code=201)
+async def create_tour(body: TourRequestIn, user=Depends(current_user)):
+    start = to_minutes(body.requested_date, body.requested_time)
+    minute = start % 1440
+    if minute < DAY_START or minute > DAY_END or minute % TOUR_MINUTES:
+        raise HTTPException(status_code=400, detail="Tours start on the half hour between 09:00 and 18:00")
+    if start <= now_minutes():
+        raise HTTPException(status_code=400, detail="Tours must be scheduled in the future")
+    owner_id, title = schedule.property_info(body.property_id)
+    if owner_id is None and datasource.is_configured():
+        raise HTTPException(status_code=404, detail="Property not found")
+
+    row = dict(body.model_dump(), requested_date=body.requested_date.isoformat(), owner_id=owner_id,
+               requester_id=user["id"] if user is not None else None)
+    provisional = schedule.reserve(row)
+    if provisional is None:
+        raise _slot_taken(body.property_id, start)
+    try:
+        if datasource.is_configured():
+            stored = await asyncio.get_running_loop().run_in_executor(
+                None, datasource.insert_rows, "tour_requests", [row])
+            created = stored[0]
+        else:
+            created = dict(row, id=schedule.next_local_id(), status="pending")
+    except urllib.error.HTTPError as exc:
+        schedule.release(provisional)
+        if exc.code == 409:
+            # The unique slot indexes caught a booking the mirror has not seen yet,
+            # so the requested slot is taken even though the index says it is free.
+            raise _slot_taken(body.property_id, start + TOUR_MINUTES)
+        logger.exception("could not store tour request for property %s", body.property_id)
+        raise HTTPException(status_code=502, detail="Tour request could not be saved")
+    except OSError:
+        schedule.release(provisional)
+        logger.exception("could not store tour request for property %s", body.property_id)
+        raise HTTPException(status_code=502, detail="Tour request could not be saved")
+    schedule.confirm_reservation(provisional, created)
+    schedule.queue_notification(created["id"], owner_id, "tour_request",
+                                f'New tour request for "{title}" from {body.requester_name}')
+    return created
+
+
+@router.patch("/api/tours/{tour_id}")
+async def update_tour_status(tour_id: int, body: TourStatusIn, user=Depends(current_user)):
+    tour = schedule.tour(tour_id)
+    if tour is None:
+        raise HTTPException(status_code=404, detail="Tour request not found")
+    if user is not None and not summary.is_admin(user["id"]):
+        is_owner = user["id"] == tour["owner_id"]
+        if not is_owner and not (user["id"] == tour["requester_id"] and body.status == "cancelled"):
+            raise HTTPException(status_code=403, detail="Not allowed to change this tour request")
+    if body.status == "confirmed":
+        clashes = schedule.conflicts(tour["property_id"], tour["owner_id"], tour["start"],
+                                     ignore=tour_id, statuses=("confirmed",))
+        if clashes:
+            raise HTTPException(status_code=409, detail={
+                "message": "Another confirmed tour overlaps this one", "conflicts": clashes})
+    if datasource.is_configured():
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, datasource.update_rows, "tour_requests", {"id": f"eq.{tour_id}"}, {"status": body.status})
+        except OSError:
+            logger.exception("could not update tour request %s", tour_id)
+            raise HTTPException(status_code=502, detail="Tour request could not be updated")
+    schedule.set_status(tour_id, body.status)
+    return {"id": tour_id, "status": body.status}
@@ -0,0 +1,9 @@
+-- Add coordinates to properties for the /api/properties/nearby endpoint
+-- Run this after database-migration.sql. Listings without coordinates are
+-- placed at the gazetteer centroid of their district or city by the backend.
+
+ALTER TABLE properties
+ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION CHECK (latitude BETWEEN -90 AND 90),
+ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION CHECK (longitude BETWEEN -180 AND 180);
+
+CREATE INDEX IF NOT EXISTS idx_properties_coordinates ON properties(latitude, longitude);
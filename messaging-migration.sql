@@ -0,0 +1,57 @@
+-- Conversation threads for the real-time messaging hub (/ws/messages)
+-- Run this after database-migration.sql
+
+-- 1. Threads between two participants, optionally about a property
+CREATE TABLE IF NOT EXISTS message_threads (
+  id SERIAL PRIMARY KEY,
+  property_id INTEGER REFERENCES properties(id) ON DELETE SET NULL,
+  participant_1 UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+  participant_2 UUID REFERENCES auth.users(id) ON DELETE CASCADE,
+  participant_1_name TEXT,
+  participant_2_name TEXT,
+  property_title TEXT,
+  last_message TEXT,
+  last_message_time TIMESTAMPTZ,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 2. Messages belong to a thread; subject is optional for chat messages
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS thread_id INTEGER REFERENCES message_threads(id) ON DELETE CASCADE;
+ALTER TABLE messages ALTER COLUMN subject DROP NOT NULL;
+
+-- 3. Indexes for keyset-paginated history and unread counts
+CREATE INDEX IF NOT EXISTS idx_message_threads_participant_1 ON message_threads(participant_1);
+CREATE INDEX IF NOT EXISTS idx_message_threads_participant_2 ON message_threads(participant_2);
+CREATE INDEX IF NOT EXISTS idx_message_threads_updated_at ON message_threads(updated_at);
+CREATE INDEX IF NOT EXISTS idx_messages_thread_id_id ON messages(thread_id, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_unread_recipient ON messages(recipient_id, thread_id) WHERE NOT is_read;
+
+-- 4. Keep the thread preview current without a second write from clients
+CREATE OR REPLACE FUNCTION touch_message_thread()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE message_threads
+    SET last_message = NEW.content, last_message_time = NEW.created_at, updated_at = NOW()
+    WHERE id = NEW.thread_id;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS touch_message_thread_on_insert ON messages;
+CREATE TRIGGER touch_message_thread_on_insert
+  AFTER INSERT ON messages
+  FOR EACH ROW WHEN (NEW.thread_id IS NOT NULL) EXECUTE FUNCTION touch_message_thread();
+
+DROP TRIGGER IF EXISTS update_message_threads_updated_at ON message_threads;
+CREATE TRIGGER update_message_threads_updated_at
+  BEFORE UPDATE ON message_threads
+  FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- 5. Row Level Security
+ALTER TABLE message_threads ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Participants can view their threads" ON message_threads
+  FOR SELECT USING (auth.uid() = participant_1 OR auth.uid() = participant_2);
+CREATE POLICY "Participants can create threads" ON message_threads
+  FOR INSERT WITH CHECK (auth.uid() = participant_1 OR auth.uid() = participant_2);
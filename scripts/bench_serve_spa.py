@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Load-test serve_spa.py in simple and production mode.
+
+Starts each mode on a free local port, holds a few idle "slow client"
+connections open, then hammers it with concurrent keep-alive clients and
+reports requests/second and latency percentiles.
+
+    python scripts/bench_serve_spa.py --dir dist --concurrency 32 --duration 10
+"""
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SERVE_SPA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve_spa.py')
+
+
+def synthetic_dist():
+    """A dist/ stand-in shaped like a Vite build, for when no build is available."""
+    root = tempfile.mkdtemp(prefix='serve_spa_bench_')
+    os.makedirs(os.path.join(root, 'assets'))
+    with open(os.path.join(root, 'index.html'), 'w') as f:
+        f.write('<!doctype html><html><head>' + '<meta name="x" content="y">' * 60 + '</head><body></body></html>')
+    with open(os.path.join(root, 'assets', 'index-3f9a1c.js'), 'w') as f:
+        f.write('export const component = () => null;\n' * 12000)
+    with open(os.path.join(root, 'assets', 'index-7be2d4.css'), 'w') as f:
+        f.write('.card{display:flex;padding:1rem}\n' * 3000)
+    with open(os.path.join(root, 'assets', 'hero-0c1d2e.jpg'), 'wb') as f:
+        f.write(os.urandom(400 * 1024))
+    return root
+
+
+def request_paths(serve_dir):
+    paths = ['/', '/listings', '/properties/42']
+    assets = os.path.join(serve_dir, 'assets')
+    if os.path.isdir(assets):
+        paths += ['/assets/' + name for name in sorted(os.listdir(assets))[:8]]
+    return paths
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def client(port, paths, deadline, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    headers = {'Accept-Encoding': 'br, gzip'}
+    i = 0
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except (OSError, http.client.HTTPException):
+            errors.append(path)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.close()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_mode(mode, serve_dir, args):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, SERVE_SPA, '--dir', serve_dir, '--port', str(port), '--mode', mode],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    idle = []
+    try:
+        wait_for_port(port)
+        for _ in range(args.idle_clients):
+            # A client that connects and sends nothing, like a stalled mobile connection.
+            idle.append(socket.create_connection(('127.0.0.1', port)))
+        paths = request_paths(serve_dir)
+        latencies, errors = [], []
+        deadline = time.monotonic() + args.duration
+        threads = [threading.Thread(target=client, args=(port, paths, deadline, latencies, errors))
+                   for _ in range(args.concurrency)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(args.duration + 15)
+        elapsed = time.monotonic() - started
+    finally:
+        for sock in idle:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+    if not latencies:
+        print(f'{mode:<11} no successful requests ({len(errors)} errors)')
+        return {'requests': 0, 'errors': len(errors)}
+    result = {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+    }
+    print(f"{mode:<11} {result['rps']:>10,.0f} req/s  p50={result['p50_ms']:.2f}ms  "
+          f"p95={result['p95_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms  errors={len(errors)}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test scripts/serve_spa.py')
+    parser.add_argument('--dir', default='dist', help='Built SPA to serve (default: dist, or a synthetic one)')
+    parser.add_argument('--modes', nargs='+', default=['simple', 'production'], choices=('simple', 'production'))
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per mode (default: 10)')
+    parser.add_argument('--idle-clients', type=int, default=1,
+                        help='Idle connections held open during the run (default: 1)')
+    args = parser.parse_args()
+
+    serve_dir = os.path.abspath(args.dir)
+    synthetic = not os.path.isfile(os.path.join(serve_dir, 'index.html'))
+    if synthetic:
+        serve_dir = synthetic_dist()
+        print(f'[bench] {args.dir} has no build, using a synthetic bundle')
+    print(f'[bench] {args.concurrency} clients, {args.idle_clients} idle, {args.duration:.0f}s per mode')
+    try:
+        for mode in args.modes:
+            run_mode(mode, serve_dir, args)
+    finally:
+        if synthetic:
+            shutil.rmtree(serve_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
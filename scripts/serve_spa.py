@@ -4,8 +4,36 @@ import socketserver
 import os
 import sys
 import argparse
+import gzip
+import hashlib
+import mimetypes
+import posixpath
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate
 from pathlib import Path
 
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Production mode tuning
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/xml',
+                      'image/svg+xml', 'application/manifest+json', 'application/wasm')
+MIN_COMPRESS_SIZE = 1024            # smaller files are not worth compressing
+MAX_MEMORY_FILE_SIZE = 1024 * 1024  # larger files are streamed with sendfile
+REVALIDATE_SECONDS = 1.0            # how often a cached entry re-checks its mtime
+MAX_MISSES = 4096                   # remembered SPA routes that are not files
+IMMUTABLE_PREFIX = '/assets/'       # Vite emits content-hashed names here
+
+mimetypes.add_type('application/javascript', '.js')
+mimetypes.add_type('application/javascript', '.mjs')
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+mimetypes.add_type('font/woff2', '.woff2')
+
+
 class SPARequestHandler(http.server.SimpleHTTPRequestHandler):
     def __init__(self, *args, directory=None, **kwargs):
         super().__init__(*args, directory=directory, **kwargs)
@@ -27,10 +55,266 @@ class SPARequestHandler(http.server.SimpleHTTPRequestHandler):
         return http.server.SimpleHTTPRequestHandler.send_head(self)
 
 
+def accepted_encodings(header):
+    """Map each content-coding in an Accept-Encoding header to its q-value."""
+    weights = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    return weights
+
+
+class CachedFile:
+    """One file on disk plus its precompressed variants, as of one mtime.
+
+    Entries are not modified after construction (apart from the revalidation
+    timestamp); a changed file gets a new entry that FileCache swaps in, so a
+    reader never pairs one version's body with another's ETag.
+    """
+
+    def __init__(self, path, url_path, st=None):
+        st = st or os.stat(path)
+        self.path = path
+        self.url_path = url_path
+        self.lock = threading.Lock()
+        self.checked = time.monotonic()
+        self.mtime_ns = st.st_mtime_ns
+        self.size = st.st_size
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        if url_path.startswith(IMMUTABLE_PREFIX):
+            self.cache_control = 'public, max-age=31536000, immutable'
+        elif url_path.endswith('.html'):
+            self.cache_control = 'no-cache'
+        else:
+            self.cache_control = 'public, max-age=3600'
+
+        self.variants = {}
+        if self.size > MAX_MEMORY_FILE_SIZE:
+            self.body = None
+            self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+            return
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        digest = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        if self.size >= MIN_COMPRESS_SIZE and self.content_type.startswith(COMPRESSIBLE_TYPES):
+            gz = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if len(gz) < self.size:
+                self.variants['gzip'] = (gz, f'"{digest}-gz"')
+            if brotli is not None:
+                br = brotli.compress(self.body, quality=11)
+                if len(br) < self.size:
+                    self.variants['br'] = (br, f'"{digest}-br"')
+
+    def revalidate(self):
+        """Re-stat at most every REVALIDATE_SECONDS.
+
+        Returns this entry, a new one if the file changed, or None once it is gone.
+        """
+        now = time.monotonic()
+        if now - self.checked < REVALIDATE_SECONDS:
+            return self
+        with self.lock:
+            if now - self.checked < REVALIDATE_SECONDS:
+                return self
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return None
+            self.checked = now
+            if st.st_mtime_ns != self.mtime_ns or st.st_size != self.size:
+                return CachedFile(self.path, self.url_path, st)
+            return self
+
+
+class FileCache:
+    """Maps URL paths to CachedFile entries, warmed at startup."""
+
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.entries = {}
+        self.misses = {}
+        self.lock = threading.Lock()
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                url_path = '/' + os.path.relpath(full, self.root).replace(os.sep, '/')
+                self.entries[url_path] = CachedFile(full, url_path)
+
+    def _resolve(self, url_path):
+        try:
+            full = os.path.realpath(os.path.join(self.root, url_path.lstrip('/')))
+        except ValueError:
+            return None  # embedded null byte, e.g. /%00
+        if full != self.root and not full.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(full):
+            full = os.path.join(full, 'index.html')
+            url_path = url_path.rstrip('/') + '/index.html'
+        if not os.path.isfile(full):
+            return None
+        return CachedFile(full, url_path)
+
+    def lookup(self, url_path):
+        """Return the entry for url_path, the SPA index.html for unknown routes, or None."""
+        entry = self.entries.get(url_path)
+        if entry is not None:
+            current = entry.revalidate()
+            if current is entry:
+                return entry
+            if current is not None:
+                with self.lock:
+                    self.entries[url_path] = current
+                return current
+        now = time.monotonic()
+        if entry is None and self.misses.get(url_path, 0) > now:
+            return self._index()
+        entry = self._resolve(url_path)
+        with self.lock:
+            if entry is not None:
+                self.entries[url_path] = entry
+                self.misses.pop(url_path, None)
+                return entry
+            self.entries.pop(url_path, None)
+            if len(self.misses) >= MAX_MISSES:
+                self.misses.clear()
+            self.misses[url_path] = now + REVALIDATE_SECONDS
+        return self._index()
+
+    def _index(self):
+        entry = self.entries.get('/index.html')
+        current = entry.revalidate() if entry is not None else None
+        if current is None:
+            current = self._resolve('/index.html')
+        if current is not None and current is not entry:
+            with self.lock:
+                self.entries['/index.html'] = current
+        return current
+
+
+class ProductionSPARequestHandler(http.server.BaseHTTPRequestHandler):
+    """Keep-alive handler serving from FileCache; no per-request path translation."""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MMHubSPA/1.0'
+    disable_nagle_algorithm = True  # headers and body are separate writes on keep-alive sockets
+    cache = None  # set by serve_production
+
+    def do_GET(self):
+        self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def serve(self, head):
+        raw_path = urllib.parse.urlsplit(self.path).path
+        url_path = posixpath.normpath(urllib.parse.unquote(raw_path))
+        if not url_path.startswith('/'):
+            url_path = '/' + url_path
+        if raw_path.endswith('/') and url_path != '/':
+            url_path += '/'
+        if url_path.endswith('/'):
+            url_path += 'index.html'
+
+        entry = self.cache.lookup(url_path)
+        if entry is None:
+            self.send_error(404, 'File not found')
+            return
+
+        body, etag, encoding = entry.body, entry.etag, None
+        if entry.variants:
+            accepted = accepted_encodings(self.headers.get('Accept-Encoding', ''))
+            for candidate in ('br', 'gzip'):
+                if candidate in entry.variants and accepted.get(candidate, accepted.get('*', 0.0)) > 0:
+                    body, etag = entry.variants[candidate]
+                    encoding = candidate
+                    break
+
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', entry.cache_control)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', entry.content_type)
+        self.send_header('Content-Length', str(len(body) if body is not None else entry.size))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', entry.last_modified)
+        self.send_header('Cache-Control', entry.cache_control)
+        if entry.variants:
+            self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        if head:
+            return
+        if body is not None:
+            self.wfile.write(body)
+            return
+        with open(entry.path, 'rb') as f:
+            self.connection.sendfile(f)  # zero-copy via os.sendfile where available
+
+    def log_message(self, format, *args):
+        pass  # per-request logging dominates throughput; use a reverse proxy for access logs
+
+
+class ProductionServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve_simple(serve_dir, port):
+    handler = lambda *hargs, **hkwargs: SPARequestHandler(*hargs, directory=serve_dir, **hkwargs)
+    with socketserver.TCPServer(("0.0.0.0", port), handler) as httpd:
+        print(f"[serve_spa] Serving {serve_dir} on http://localhost:{port}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+
+def serve_production(serve_dir, port):
+    started = time.perf_counter()
+    cache = FileCache(serve_dir)
+    compressed = sum(1 for entry in cache.entries.values() if entry.variants)
+    handler = type('Handler', (ProductionSPARequestHandler,), {'cache': cache})
+    with ProductionServer(("0.0.0.0", port), handler) as httpd:
+        print(f"[serve_spa] Cached {len(cache.entries)} files ({compressed} precompressed"
+              f"{', brotli' if brotli else ''}) in {time.perf_counter() - started:.2f}s")
+        print(f"[serve_spa] Serving {serve_dir} on http://localhost:{port} (production mode)")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+
+
 def main():
     parser = argparse.ArgumentParser(description='Serve a SPA with history fallback')
     parser.add_argument('--dir', default='dist', help='Directory to serve (default: dist)')
     parser.add_argument('--port', type=int, default=8080, help='Port to listen on (default: 8080)')
+    parser.add_argument('--mode', choices=('simple', 'production'), default='simple',
+                        help='simple: single-threaded SimpleHTTPRequestHandler; production: threaded, '
+                             'cached, precompressed (default: simple)')
     args = parser.parse_args()
 
     serve_dir = os.path.abspath(args.dir)
@@ -38,15 +322,10 @@ def main():
         print(f"[serve_spa] Directory not found: {serve_dir}", file=sys.stderr)
         sys.exit(1)
 
-    handler = lambda *hargs, **hkwargs: SPARequestHandler(*hargs, directory=serve_dir, **hkwargs)
-    with socketserver.TCPServer(("0.0.0.0", args.port), handler) as httpd:
-        print(f"[serve_spa] Serving {serve_dir} on http://localhost:{args.port}")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            pass
-        finally:
-            httpd.server_close()
+    if args.mode == 'production':
+        serve_production(serve_dir, args.port)
+    else:
+        serve_simple(serve_dir, args.port)
 
 if __name__ == '__main__':
     main()
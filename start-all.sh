@@ -68,13 +68,19 @@ echo "[start] Backend (FastAPI/Uvicorn)"
   # Ensure pip corresponds to the selected python
   PIP_CMD="$PYTHON_BIN -m pip"
 
-  if ! $PYTHON_BIN -c 'import fastapi, uvicorn' 2>/dev/null; then
+  if ! $PYTHON_BIN -c 'import fastapi, uvicorn, numpy, PIL' 2>/dev/null; then
     echo "[backend] Installing dependencies from requirements.txt..."
     $PIP_CMD install -q -r requirements.txt || {
       echo "[backend][error] Failed installing dependencies" >&2; exit 1; }
   fi
+  # Load backend/.env (SUPABASE_*, METRICS_TOKEN, ...) when present; needs python-dotenv from uvicorn[standard]
+  ENV_ARGS=()
+  if [[ -f ".env" ]]; then
+    ENV_ARGS=(--env-file .env)
+  fi
   echo "[backend] Starting Uvicorn (hot reload)"
-  exec $PYTHON_BIN -m uvicorn main:app --host 0.0.0.0 --port ${BACKEND_PORT} --reload
+  exec $PYTHON_BIN -m uvicorn main:app --host 0.0.0.0 --port ${BACKEND_PORT} --reload --ws-per-message-deflate false \
+    ${ENV_ARGS[@]+"${ENV_ARGS[@]}"}
 ) & BACKEND_PID=$!
 
 echo "[start] Frontend (${FRONTEND_MODE})"
@@ -0,0 +1,20 @@
+-- Database-side guard and indexes for tour scheduling (/api/tours)
+-- Run this after tour-migration.sql
+
+-- 1. Availability and conflict lookups by property/owner and day
+CREATE INDEX IF NOT EXISTS idx_tour_requests_property_slot ON tour_requests(property_id, requested_date, requested_time);
+CREATE INDEX IF NOT EXISTS idx_tour_requests_owner_slot ON tour_requests(owner_id, requested_date, requested_time);
+CREATE INDEX IF NOT EXISTS idx_tour_notifications_tour_request_id ON tour_notifications(tour_request_id);
+
+-- 2. Tours last one 30-minute slot and start on the half hour, so overlapping
+--    active tours share a start time. These partial unique indexes reject
+--    double bookings even from clients that write to Supabase directly.
+--    Existing clashes must be resolved first; list them with:
+--      SELECT property_id, requested_date, requested_time, COUNT(*) FROM tour_requests
+--      WHERE status IN ('pending', 'confirmed') GROUP BY 1, 2, 3 HAVING COUNT(*) > 1;
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_tour_requests_property_active_slot
+  ON tour_requests(property_id, requested_date, requested_time)
+  WHERE status IN ('pending', 'confirmed');
+CREATE UNIQUE INDEX IF NOT EXISTS uniq_tour_requests_owner_active_slot
+  ON tour_requests(owner_id, requested_date, requested_time)
+  WHERE status IN ('pending', 'confirmed');